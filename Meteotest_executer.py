@@ -1,37 +1,61 @@
 # Created by Giacomo Mastroddi August 2023
 
+import time
+import numpy as np
 import pandas as pd
 from typing import Tuple
+from functools import partial
 from Meteotest_requester import MeteotestRequester
 
 class MeteotestExecuter():
-    """ Class for calling multiple times requester functions.
+    """ Class for calling multiple times requester functions. The site requests of a batch are sent concurrently,
+        under the rate limit of the requester.
 
     Attributes:
         requester (ApiRequester): The requester object. """
 
+    POSITION_TOLERANCE: float = 50.0 # in meters, a site closer than this to a desired site is kept as is
+    EARTH_RADIUS: float = 6371000.0 # in meters
+    FORECAST_ACTIONS: dict = {'SF': 'getforecast', 'CM': 'getforecast_cloudmove'} # forecast type to requester action
+
     def __init__(self, requester:MeteotestRequester, print_is_requested:bool=False) -> None:
         self.requester = requester
         self.print_is_requested = print_is_requested
 
     @property
     def get_all_site_id(self) -> list:
-        """ Returns a list with all sites id. """
+        """ Returns a list with all sites id from the site registry, reconciled with siteinfo first if needed. """
 
-        site_info_df = self.requester.get_site_info()
-        return site_info_df.index.tolist()
+        self.requester.reconcile_sites()
+        return sorted(self.requester.registry.ids)
 
     def _check_sites_id(self, sites_id_to_check:list) -> None:
-        """ Check that all sites id are present in the site info DataFrame.
+        """ Check that all sites id are present in the site registry.
         
             Inputs:
                 sites_id (list): The list of sites id to check. """
 
-        sets_are_equal = set(self.get_all_site_id) == set(sites_id_to_check)
+        sets_are_equal = self.requester.registry.ids == set(sites_id_to_check)
 
         if not sets_are_equal:
             raise ValueError('Some sites id are not present in the site info.')
 
+    def _run_concurrently(self, calls:list) -> list:
+        """ Run the requester calls concurrently, with up to max_workers of the requester executor in flight.
+            The requester retries each request and handles the connection errors.
+
+            Inputs:
+                calls (list): The calls without arguments, e.g. partial(self.requester.get_site_delete, site_id).
+
+            Returns:
+                results (list): The result of each call in the input order, None for the calls that raised. """
+        results, failures = self.requester.executor.map(lambda call: call(), calls, retry=False)
+
+        for i, e in failures.items():
+            print(f'{calls[i].func.__name__} with {calls[i].args or calls[i].keywords} failed: {type(e).__name__}: {e}')
+
+        return results
+
     def add_sites(self, to_add_df:pd.DataFrame, print_is_requested:bool=False) -> None:
         """ Add multiple sites by calling the requester given the route dataframe. The name is automatically created as incremental number.
         
@@ -43,14 +67,11 @@ class MeteotestExecuter():
         if 'latitude' not in to_add_df.columns or 'longitude' not in to_add_df.columns:
             raise ValueError('The dataframe has to have latitude and longitude columns.')
         
-        count = 0
-        for _, row in to_add_df.iterrows():
-            name = str(count)
-            latitude = row['latitude']
-            longitude = row['longitude']
-
-            self.requester.get_site_add(name=name, latitude=latitude, longitude=longitude, print_is_requested=print_is_requested)
-            count += 1
+        calls = [
+            partial(self.requester.get_site_add, name=str(count), latitude=float(latitude), longitude=float(longitude), print_is_requested=print_is_requested)
+            for count, (latitude, longitude) in enumerate(zip(to_add_df['latitude'], to_add_df['longitude']))
+        ]
+        self._run_concurrently(calls)
 
         if self.print_is_requested or print_is_requested:
             print(f"Requested sites have been added: \n {self.requester.forecast_sites}")
@@ -67,38 +88,32 @@ class MeteotestExecuter():
 
         self._check_sites_id(to_edit_df.index.tolist())
 
-        for site_id in to_edit_df.index:
-            change_name = True
-            change_position = True
+        # Check if the name and position columns exist
+        change_name = 'name' in to_edit_df.columns
+        change_position = 'latitude' in to_edit_df.columns and 'longitude' in to_edit_df.columns
 
-            # Check if the name column exists
-            if 'name' not in to_edit_df.columns:
-                change_name = False
-            
-            # Check if the position columns exist
-            if 'latitude' not in to_edit_df.columns or 'longitude' not in to_edit_df.columns:
-                change_position = False
-
-            # Extract the value to change
-            if change_name and change_position:
-                name = to_edit_df.loc[site_id, 'name']
-                latitude = to_edit_df.loc[site_id, 'latitude']
-                longitude = to_edit_df.loc[site_id, 'longitude']
-                position = {'longitude': longitude, 'latitude': latitude}
-                self.requester.get_site_edit(site_id, print_is_requested=print_is_requested, name=name, position=position)
-            
-            elif change_name:
-                name = to_edit_df.loc[site_id, 'name']
-                self.requester.get_site_edit(site_id, print_is_requested=print_is_requested, name=name)
-            
-            elif change_position:
-                latitude = to_edit_df.loc[site_id, 'latitude']
-                longitude = to_edit_df.loc[site_id, 'longitude']
-                position = {'longitude': longitude, 'latitude': latitude}
-                self.requester.get_site_edit(site_id, print_is_requested=print_is_requested, position=position)
-            else:
-                print("Nothing to change for this site.")
-                return
+        if not change_name and not change_position:
+            print("Nothing to change for these sites.")
+            return
+
+        calls = []
+        for site_id, row in zip(to_edit_df.index, to_edit_df.to_dict('records')):
+            kwargs = {}
+
+            # Extract the values to change, the unchanged ones are skipped
+            if change_name and row['name'] is not None and not pd.isna(row['name']) and row['name'] != '':
+                kwargs['name'] = row['name']
+
+            if change_position and not pd.isna(row['latitude']) and not pd.isna(row['longitude']):
+                kwargs['position'] = {'longitude': float(row['longitude']), 'latitude': float(row['latitude'])}
+
+            if not kwargs:
+                print(f"Nothing to change for site {site_id}.")
+                continue
+
+            calls.append(partial(self.requester.get_site_edit, int(site_id), print_is_requested=print_is_requested, **kwargs))
+
+        self._run_concurrently(calls)
 
         if self.print_is_requested or print_is_requested:
             print(f"Requested sites have been edited: \n {self.requester.forecast_sites}")
@@ -112,11 +127,8 @@ class MeteotestExecuter():
 
         self._check_sites_id(to_delete_df.index.tolist())
 
-        
-        for site_id in to_delete_df.index:
-            self.requester.get_site_delete(site_id, print_is_requested=print_is_requested)
-        
-        # to_delete_df.apply(lambda row: self.requester.get_site_delete(row.name, print_is_requested=print_is_requested), axis=1)
+        calls = [partial(self.requester.get_site_delete, int(site_id), print_is_requested=print_is_requested) for site_id in to_delete_df.index]
+        self._run_concurrently(calls)
 
         if self.print_is_requested or print_is_requested:
             print(f"Requested sites have been deleted: \n {self.requester.forecast_sites}")
@@ -128,47 +140,187 @@ class MeteotestExecuter():
                 print_is_requested (bool): Whether to print the requested sites. """
         
         sites_id_list = self.get_all_site_id
-        for site_id in sites_id_list:
-            self.requester.get_site_delete(site_id, print_is_requested=print_is_requested)
-
-        # sites_id_list.apply(lambda site_id: self.requester.get_site_delete(site_id, print_is_requested=print_is_requested))
+        calls = [partial(self.requester.get_site_delete, int(site_id), print_is_requested=print_is_requested) for site_id in sites_id_list]
+        self._run_concurrently(calls)
         
         if self.print_is_requested or print_is_requested:
             print(f"All sites have been deleted: \n {self.requester.forecast_sites}")
 
-    def _new_forecasts_arrived(self, old_forecast_df:pd.DataFrame, new_forecast_df:pd.DataFrame, forecast_type:str) -> bool:
-        """ Check if the new forecast is different from the previous one.
+    def _match_sites(self, current_positions:np.ndarray, desired_positions:np.ndarray) -> list:
+        """ Match the current sites to the desired positions closer than POSITION_TOLERANCE, closest pairs first.
+
+            Inputs:
+                current_positions (np.ndarray): The latitude and longitude of the current sites with shape (n, 2).
+                desired_positions (np.ndarray): The latitude and longitude of the desired sites with shape (m, 2).
+
+            Returns:
+                matches (list): The (current, desired) position pairs. """
+        if len(current_positions) == 0 or len(desired_positions) == 0:
+            return []
+
+        # Equirectangular distance, accurate at the tolerance scale
+        latitude = np.radians(current_positions[:, 0])[:, np.newaxis]
+        d_latitude = latitude - np.radians(desired_positions[:, 0])[np.newaxis, :]
+        d_longitude = np.radians(current_positions[:, 1])[:, np.newaxis] - np.radians(desired_positions[:, 1])[np.newaxis, :]
+        distances = self.EARTH_RADIUS * np.hypot(d_latitude, d_longitude * np.cos(latitude))
+
+        current_candidates, desired_candidates = np.nonzero(distances <= self.POSITION_TOLERANCE)
+        order = np.argsort(distances[current_candidates, desired_candidates], kind='stable')
+
+        matches = []
+        current_matched = set()
+        desired_matched = set()
+        for i, j in zip(current_candidates[order], desired_candidates[order]):
+            if i not in current_matched and j not in desired_matched:
+                matches.append((int(i), int(j)))
+                current_matched.add(i)
+                desired_matched.add(j)
+
+        return matches
+
+    def sync_sites(self, desired_sites:pd.DataFrame, print_is_requested:bool=False) -> dict:
+        """ Make the Meteotest sites match the desired sites with the fewest requests. Sites already within POSITION_TOLERANCE
+            of a desired site are kept, the other sites are moved to the remaining desired positions with siteedit, and only the
+            difference in number is added or deleted. Each phase sends its requests concurrently under the rate limit;
+            deletions run before additions, so that the number of sites never exceeds the larger of the two.
+
+            Inputs:
+                desired_sites (pd.DataFrame): The desired sites with latitude and longitude columns, e.g. the cut route dataframe.
+                    The sites are named after the name column if given, otherwise after their row label, which the preprocessor maps to
+                    the cumDistance; kept sites with another name are renamed.
+                print_is_requested (bool): Whether to print the changes and timings.
+
+            Returns:
+                report (dict): The changes with keys:
+                    kept, edited, added, deleted (list): The site ids of each kind of change.
+                    failed (list): The (action, site id or desired row label) of the requests that failed.
+                    site_ids (pd.Series): The site id of each desired site, indexed as desired_sites, missing if its request failed.
+                    timings (dict): The duration of the plan, edit, delete and add phases and the total in seconds. """
+        if 'latitude' not in desired_sites.columns or 'longitude' not in desired_sites.columns:
+            raise ValueError('The dataframe has to have latitude and longitude columns.')
+
+        start_time = time.perf_counter()
+        timings = {}
+
+        # Plan, from the site registry reconciled with siteinfo first if needed
+        self.requester.reconcile_sites()
+        current_sites = self.requester.forecast_sites
+        if current_sites is None or current_sites.empty:
+            current_ids = []
+            current_positions = np.empty((0, 2))
+        else:
+            current_ids = [int(site_id) for site_id in current_sites.index]
+            current_positions = current_sites[['latitude', 'longitude']].to_numpy(dtype=np.float64)
+
+        desired_positions = desired_sites[['latitude', 'longitude']].to_numpy(dtype=np.float64)
+        # The preprocessor maps the site names to the row labels of the route dataframe
+        if 'name' in desired_sites.columns:
+            desired_names = desired_sites['name'].astype(str).tolist()
+        else:
+            desired_names = [str(label) for label in desired_sites.index]
+
+        matches = self._match_sites(current_positions, desired_positions)
+        site_ids = [None] * len(desired_sites)
+        for i, j in matches:
+            site_ids[j] = current_ids[i]
+
+        matched_current = {i for i, _ in matches}
+        matched_desired = {j for _, j in matches}
+        free_current = [i for i in range(len(current_ids)) if i not in matched_current]
+        free_desired = [j for j in range(len(desired_sites)) if j not in matched_desired]
+
+        # Edits are preferred over a deletion and an addition
+        n_edits = min(len(free_current), len(free_desired))
+        moves = list(zip(free_current[:n_edits], free_desired[:n_edits]))
+        renames = [(i, j) for i, j in matches if str(current_sites.iloc[i]['name']) != desired_names[j]]
+        deletions = free_current[n_edits:]
+        additions = free_desired[n_edits:]
+        timings['plan'] = time.perf_counter() - start_time
+
+        report = {'kept': [current_ids[i] for i, j in matches if (i, j) not in renames], 'edited': [], 'added': [], 'deleted': [], 'failed': []}
+
+        # Edit
+        phase_start_time = time.perf_counter()
+        edits = moves + renames
+        calls = []
+        for i, j in moves:
+            position = {'longitude': float(desired_positions[j, 1]), 'latitude': float(desired_positions[j, 0])}
+            calls.append(partial(self.requester.get_site_edit, current_ids[i], print_is_requested=print_is_requested, name=desired_names[j], position=position))
+        for i, j in renames:
+            calls.append(partial(self.requester.get_site_edit, current_ids[i], print_is_requested=print_is_requested, name=desired_names[j]))
+
+        for (i, j), edited in zip(edits, self._run_concurrently(calls)):
+            if edited:
+                report['edited'].append(current_ids[i])
+                site_ids[j] = current_ids[i]
+            else:
+                report['failed'].append(('siteedit', current_ids[i]))
+                site_ids[j] = None
+        timings['edit'] = time.perf_counter() - phase_start_time
+
+        # Delete
+        phase_start_time = time.perf_counter()
+        calls = [partial(self.requester.get_site_delete, current_ids[i], print_is_requested=print_is_requested) for i in deletions]
+        for i, deleted in zip(deletions, self._run_concurrently(calls)):
+            if deleted:
+                report['deleted'].append(current_ids[i])
+            else:
+                report['failed'].append(('sitedelete', current_ids[i]))
+        timings['delete'] = time.perf_counter() - phase_start_time
+
+        # Add
+        phase_start_time = time.perf_counter()
+        calls = [
+            partial(self.requester.get_site_add, name=desired_names[j], latitude=float(desired_positions[j, 0]), longitude=float(desired_positions[j, 1]),
+                    print_is_requested=print_is_requested)
+            for j in additions
+        ]
+        for j, site_id in zip(additions, self._run_concurrently(calls)):
+            if site_id is not None:
+                report['added'].append(site_id)
+                site_ids[j] = site_id
+            else:
+                report['failed'].append(('siteadd', desired_sites.index[j]))
+        timings['add'] = time.perf_counter() - phase_start_time
+
+        timings['total'] = time.perf_counter() - start_time
+        report['site_ids'] = pd.Series(site_ids, index=desired_sites.index, name='site_id', dtype='Int64')
+        report['timings'] = timings
+
+        if self.print_is_requested or print_is_requested:
+            print(f"Sites synchronized in {timings['total']:.2f} s: {len(report['kept'])} kept, {len(report['edited'])} edited, "
+                  f"{len(report['added'])} added, {len(report['deleted'])} deleted, {len(report['failed'])} failed.")
+
+        return report
+
+    def _new_forecasts_arrived(self, new_forecast_df:pd.DataFrame, forecast_type:str) -> bool:
+        """ Check if the forecast is a new issuance, from the hash of its raw payload recorded by the requester.
         
             Inputs:
-                old_forecast_df (pd.DataFrame): The previous forecast dataframe.
-                new_forecast_df (pd.DataFrame): The new forecast dataframe.
+                new_forecast_df (pd.DataFrame): The new forecast dataframe, None if it could not be retrieved.
                 type (str): The type of forecast. """
         
         # Check that the forecast type is correct
-        if "SF" not in forecast_type and "CM" not in forecast_type:
+        if forecast_type not in self.FORECAST_ACTIONS:
             raise ValueError(f"The type has to be 'SF' or 'CM'. Received: {forecast_type}")
         
-        # Check for empty dataframes
-        if new_forecast_df.empty:
+        # Check for missing or empty dataframes
+        if new_forecast_df is None or new_forecast_df.empty:
             new_forecast_arrived = False
 
-        elif old_forecast_df.empty:
+        elif self.requester.new_issuance[self.FORECAST_ACTIONS[forecast_type]]:
             new_forecast_arrived = True
             print(f"New {forecast_type} forecast arrived")
 
-        # Check first rows
-        elif new_forecast_df.head().equals(old_forecast_df.head()):
+        else:
             new_forecast_arrived = False
             print(f"No new {forecast_type} forecast")
-
-        else:
-            new_forecast_arrived = True
-            print(f"New {forecast_type} forecast arrived")
         
         return new_forecast_arrived
 
     def get_new_forecasts(self) -> Tuple[pd.DataFrame, bool, pd.DataFrame, bool]:
-        """ Get the new solar forecast and cloudmove forecast.
+        """ Get the new solar forecast and cloudmove forecast. A forecast that is not a new issuance is returned empty,
+            so that it is not preprocessed again.
         
             Returns:
                 new_SF_forecast_df (pd.DataFrame): The new solar forecast dataframe.
@@ -176,18 +328,16 @@ class MeteotestExecuter():
                 new_CM_forecast_df (pd.DataFrame): The new cloudmove forecast dataframe.
                 CM_arrived (bool): Whether the new cloudmove forecast arrived."""
         
-        old_CM_forecast_df = self.requester.previous_CM_df
         new_CM_forecast_df = self.requester.get_solar_forecast_cloudmove()
-        CM_arrived = self._new_forecasts_arrived(old_CM_forecast_df, new_CM_forecast_df, "CM")
+        CM_arrived = self._new_forecasts_arrived(new_CM_forecast_df, "CM")
 
         if not CM_arrived:
             new_CM_forecast_df = pd.DataFrame()
 
-        old_SF_forecast_df = self.requester.previous_SF_df
         new_SF_forecast_df = self.requester.get_solar_forecast()
-        SF_arrived = self._new_forecasts_arrived(old_SF_forecast_df, new_SF_forecast_df, "SF")
+        SF_arrived = self._new_forecasts_arrived(new_SF_forecast_df, "SF")
 
         if not SF_arrived:
             new_SF_forecast_df = pd.DataFrame()
 
-        return new_SF_forecast_df, SF_arrived, new_CM_forecast_df, CM_arrived
\ No newline at end of file
+        return new_SF_forecast_df, SF_arrived, new_CM_forecast_df, CM_arrived
@@ -1,41 +1,134 @@
 # Created by Giacomo Mastroddi August 2023
 
+import gzip
+import json
+import math
 import requests
+import urllib.parse
 import constants
 import pandas as pd
 from typing import Tuple
 from dateutil.tz import tzlocal
 from Meteotest_parser import MeteotestParser
+from forecast_cache import ForecastCache
+from site_registry import SiteRegistry
+from issuance_detector import IssuanceDetector
+from request_executor import RequestExecutor, CircuitOpenError
 
 class MeteotestRequester():
     """ Class for interacting with the weather forecast API from Meteotest.
 
     Attributes:
-        website (str): The base API URL.
+        website (str): The base API URL (default: WEBSITE).
         key (str): The API key for authentication.
         service (str): The service to be used.
         format (str): The response format (default: 'json').
-        timeout (int): The timeout for the request (default: 10)."""
+        timeout (tuple): The connect and read timeouts of each request in seconds (default: (CONNECT_TIMEOUT, TIMEOUT)).
+        pool_size (int): The maximum number of kept-alive connections to the API (default: POOL_SIZE).
+        session (requests.Session): The pooled session sending all requests, reusing the connections.
+        cache (ForecastCache): The on-disk forecast cache, None to always call the API.
+        executor (RequestExecutor): The executor retrying the requests, with the circuit breaker and rate limit of Meteotest.
+        registry (SiteRegistry): The local registry of the sites, updated by the site requests and reconciled with siteinfo when needed.
+        issuance (IssuanceDetector): The detector of new forecast issuances, with their history for each action.
+        new_issuance (dict): Whether the last forecast of each action was a new issuance."""
         
-    WEBSITE: str = 'https://mdx.meteotest.ch/api_v1'
+    WEBSITE: str = getattr(constants, 'METEOTEST_URL', 'https://mdx.meteotest.ch/api_v1') # e.g. the url of a MockProviderServer
     KEY: str = constants.KEY_METEOTEST
     SERVICE: str = 'solarforecast'
     FORMAT: str = 'json'
-    TIMEOUT: int = 10
-
-    def __init__(self, parser:MeteotestParser, print_is_requested:bool=False) -> None:
+    TIMEOUT: int = 10 # read timeout in seconds
+    CONNECT_TIMEOUT: float = 5.0 # in seconds
+    POOL_SIZE: int = 16 # kept-alive connections, at least the number of concurrent requests
+    RATE_LIMIT: float = getattr(constants, 'METEOTEST_RATE_LIMIT', 10.0) # requests per second
+
+    def __init__(self, parser:MeteotestParser, print_is_requested:bool=False, cache:ForecastCache=None, website:str=None,
+                 pool_size:int=None, connect_timeout:float=None, read_timeout:float=None, registry:SiteRegistry=None) -> None:
+        self.website = website if website is not None else self.WEBSITE
         self.parser = parser
-        self.forecast_sites = self.get_site_info()
+        self.cache = cache
+
+        self.pool_size = pool_size if pool_size is not None else self.POOL_SIZE
+        self.timeout = (connect_timeout if connect_timeout is not None else self.CONNECT_TIMEOUT,
+                        read_timeout if read_timeout is not None else self.TIMEOUT)
+
+        if self.pool_size < 1 or min(self.timeout) <= 0:
+            raise ValueError(f'pool_size and timeouts have to be positive. Received: {self.pool_size} and {self.timeout}')
+
+        self.session = self._create_session(self.pool_size)
+        self.executor = RequestExecutor('meteotest', max_workers=self.pool_size, rate_limit=self.RATE_LIMIT)
+
+        # Only the first start, or a stale or drifted registry, waits for siteinfo
+        self.registry = registry if registry is not None else SiteRegistry(source=self.website)
+        self.reconcile_sites()
 
         self.previous_SF_df = pd.DataFrame()
         self.previous_SF_time: pd.Timestamp = pd.NaT
         self.previous_CM_df = pd.DataFrame()
         self.previous_CM_time: pd.Timestamp = pd.NaT
 
+        self.issuance = IssuanceDetector()
+        self.new_issuance: dict = {'getforecast': False, 'getforecast_cloudmove': False}
+
         if print_is_requested:
             print("Current sites' info has been retrieved:")
             self.print_current_sites
 
+    @staticmethod
+    def _create_session(pool_size:int) -> requests.Session:
+        """ Return a session keeping up to pool_size connections alive. Retries are left to the executor.
+
+            Inputs:
+                pool_size (int): The maximum number of kept-alive connections per host. """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self) -> None:
+        """ Close the kept-alive connections. """
+        self.session.close()
+
+    @property
+    def forecast_sites(self) -> pd.DataFrame:
+        """ Return the sites of the registry with site_id as index. """
+        return self.registry.sites
+
+    def reconcile_sites(self, force:bool=False, print_is_requested:bool=False) -> bool:
+        """ Reconcile the registry with siteinfo if reconcile_interval has elapsed or a drift was detected.
+            Return whether the registry has been reconciled.
+
+            Inputs:
+                force (bool): Whether to reconcile anyway (default: False).
+                print_is_requested (bool): Whether to print the result (default: False). """
+        if not force and not self.registry.needs_reconciliation:
+            return False
+
+        site_info_df = self.get_site_info()
+
+        if site_info_df is None:
+            return False
+
+        differed = self.registry.reconcile(site_info_df)
+
+        if print_is_requested:
+            print(f"Site registry reconciled (version {self.registry.version}, {'changed' if differed else 'unchanged'}).")
+
+        return True
+
+    @staticmethod
+    def _response_error(response:requests.models.Response) -> str:
+        """ Return the error status of a JSON response, None if there is no error. """
+        if 'application/json' not in response.headers.get('Content-Type', ''):
+            return None
+
+        try:
+            status = str(response.json().get('status', ''))
+        except ValueError:
+            return None
+
+        return status if 'error' in status.lower() else None
+
     @property
     def print_current_sites(self) -> None:
         """ Print the current sites' info."""
@@ -81,10 +174,18 @@ class MeteotestRequester():
 
                 # Check site id
                 if variable == 'site_id':
-                    indices = self.forecast_sites.index
-                    if value not in indices:
-                        raise ValueError(f'{variable} has to be one of {indices}. Received: {value}')
+                    if value not in self.registry:
+                        raise ValueError(f'{variable} has to be one of {sorted(self.registry.ids)}. Received: {value}')
     
+    def _request(self, method:str, **kwargs) -> requests.models.Response:
+        """ Send a request through the pooled session. Raise an HTTPError on rate limits and server errors, so that they are retried. """
+        response = self.session.request(method, timeout=self.timeout, **kwargs)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise requests.HTTPError(f'{response.status_code} error from Meteotest', response=response)
+
+        return response
+
     def _send_get_request(self, variables:dict) -> Tuple[requests.models.Response, bool]:
         """ Format the URL and send a GET request to the API. 
         
@@ -93,67 +194,116 @@ class MeteotestRequester():
 
         self._check_variables(variables)
 
-        mdx_url = f'{self.WEBSITE}?key={self.KEY}&service={self.SERVICE}&format={self.FORMAT}'
+        mdx_url = f'{self.website}?key={self.KEY}&service={self.SERVICE}&format={self.FORMAT}'
         for key, value in variables.items():
             mdx_url += f'&{key}={value}'
 
         try:
-            response = requests.get(url=mdx_url, timeout=self.TIMEOUT)
+            response = self.executor.call(self._request, 'GET', url=mdx_url)
             return response, True
         
-        except (requests.ConnectionError, requests.Timeout):
-            print("No internet connection or the connection timed out.")
+        except (requests.RequestException, CircuitOpenError) as e:
+            print(f"No internet connection or the connection timed out: {e}")
             return None, False
     
-    def _send_post_request(self, variables:dict) -> Tuple[requests.models.Response, bool]:
+    def _send_post_request(self, variables:dict, compress:bool=False) -> Tuple[requests.models.Response, bool]:
         """ Send a POST request.
         
         Inputs:
-            variables (dict): The variables to be sent to the API. """
+            variables (dict): The variables to be sent to the API.
+            compress (bool): Whether to gzip the form body (default: False). """
         
+        data = variables
+        headers = None
+        if compress:
+            data = gzip.compress(urllib.parse.urlencode(variables).encode())
+            headers = {'Content-Type': 'application/x-www-form-urlencoded', 'Content-Encoding': 'gzip'}
+
         try:
-            response = requests.post(url=self.WEBSITE, data=variables, timeout=self.TIMEOUT)
+            response = self.executor.call(self._request, 'POST', url=self.website, data=data, headers=headers)
             return response, True
         
-        except requests.ConnectionError or requests.ConnectTimeout:
-            print("No internet connection.")
+        except (requests.RequestException, CircuitOpenError) as e:
+            print(f"No internet connection or the connection timed out: {e}")
             return None, False
     
-    def post_add_measurement(self, gh_df:pd.DataFrame, print_is_requested:bool=False) -> None:
-        """ Call the API to post the irradiance measurements.
+    @staticmethod
+    def measurements_dict(gh_df:pd.DataFrame) -> dict:
+        """ Return the measurements in the nested format of add_measurements: {site_id: {UTC time: {'gh': value}}}.
 
             Inputs:
-                gh_df (pd.DataFrame): The irradiance dataframe with site id and time as index and global irradiance (gh) as columns. """
-        
-        # Convert the irradiance dataframe to dictionary
-        gh_dict = {
-            site_id: {
-                time: {"gh": row['gh']} for time, row in group.iterrows()
-            }
-            for site_id, group in gh_df.groupby(level='site_id')
-        }
+                gh_df (pd.DataFrame): The irradiance dataframe with site id and time as index and global irradiance (gh) as columns.
+                    Times without timezone are in constants.TIMEZONE. Missing or infinite values are left out. """
+        times = pd.DatetimeIndex(gh_df.index.get_level_values('time'))
+        if times.tz is None:
+            times = times.tz_localize(constants.TIMEZONE)
+
+        # Same time format as the forecasts
+        time_strings = times.tz_convert('UTC').strftime('%Y-%m-%d %H:%M:%S')
+
+        measurements = {}
+        for site_id, time_string, gh in zip(gh_df.index.get_level_values('site_id'), time_strings, gh_df['gh'].to_numpy(dtype=float).tolist()):
+            if not math.isfinite(gh):
+                continue
+            measurements.setdefault(str(site_id), {})[time_string] = {'gh': gh}
+
+        return measurements
+
+    def post_measurements(self, measurements:dict, compress:bool=False) -> Tuple[bool, bool]:
+        """ Call the API to post measurements in the add_measurements format.
+
+            Inputs:
+                measurements (dict): The measurements, see MeteotestRequester.measurements_dict.
+                compress (bool): Whether to gzip the body (default: False).
+
+            Returns:
+                accepted (bool): Whether the measurements have been accepted.
+                internet_on (bool): Whether the API could be reached; False after the retries of a connection error, rate limit,
+                    or server error. Measurements not accepted with internet_on are rejected and sending them again will not help. """
+        try:
+            measurements_json = json.dumps(measurements, separators=(',', ':'), allow_nan=False)
+        except (TypeError, ValueError) as e:
+            print(f'Measurements have been rejected: {e}')
+            return False, True
 
         variables = {
             'key': self.KEY,
             'service': self.SERVICE,
             'format': self.FORMAT,
             'action': 'add_measurements',
-            'measurements': str(gh_dict)
+            'measurements': measurements_json
         }
-        response, internet_on = self._send_post_request(variables)
-
-        # TODO CHECK POST RESPONSE
+        response, internet_on = self._send_post_request(variables, compress=compress)
 
         if not internet_on:
-            return
+            return False, False
+
+        # Parser not needed, because the response is only checked for errors
+        error = self._response_error(response)
+        if error is not None or not response.ok:
+            print(f'Measurements have been rejected: {error or response.status_code}')
+            return False, True
+
+        return True, True
+
+    def post_add_measurement(self, gh_df:pd.DataFrame, print_is_requested:bool=False, compress:bool=False) -> bool:
+        """ Call the API to post the irradiance measurements. Return whether they have been accepted.
+            For a continuous stream of measurements, use a MeasurementUplink.
+
+            Inputs:
+                gh_df (pd.DataFrame): The irradiance dataframe with site id and time as index and global irradiance (gh) as columns.
+                print_is_requested (bool): Whether to print the result (default: False).
+                compress (bool): Whether to gzip the body (default: False). """
         
-        # Parser not needed, because the response is not interesting
+        sent, _ = self.post_measurements(self.measurements_dict(gh_df), compress=compress)
 
-        if print_is_requested:
+        if sent and print_is_requested:
             print('Measurements have been sent.')
 
-    def get_site_add(self, name:str, latitude:float, longitude:float, azimuth:int=0, inclination:int=0, print_is_requested:bool=False) -> None:
-        """ Call the API to add a new site given the inputs. 
+        return sent
+
+    def get_site_add(self, name:str, latitude:float, longitude:float, azimuth:int=0, inclination:int=0, print_is_requested:bool=False) -> int:
+        """ Call the API to add a new site given the inputs. Return the id of the new site, None if the request failed. 
         
             Inputs:
                 name (str): The name of the site.
@@ -174,19 +324,24 @@ class MeteotestRequester():
         response, internet_on = self._send_get_request(variables)
 
         if not internet_on:
-            return
+            return None
         
         # Extract the required information from response_dict
         response_df = self.parser.parse_site_add_response(response, function_tag=variables['action'])
 
-        # Add the new site to the forecast_sites DataFrame
-        self.forecast_sites = pd.concat([self.forecast_sites, response_df])
+        if response_df.empty:
+            return None
+
+        # Add the new site to the registry
+        self.registry.add(response_df)
 
         if print_is_requested:
             print(f'Site with name {name} has been added.')
 
-    def get_site_edit(self, site_id:int, print_is_requested:bool=False, **kwargs) -> None:
-        """ Edit name or position (longitude and latitude).
+        return int(response_df.index[0])
+
+    def get_site_edit(self, site_id:int, print_is_requested:bool=False, **kwargs) -> bool:
+        """ Edit name or position (longitude and latitude). Return whether the site has been edited.
         
             Inputs:
                 site_id (int): The id of the site to be edited.
@@ -239,29 +394,37 @@ class MeteotestRequester():
         if not correct_kwargs:
             print_is_requested = False
             print("Nothing to edit.")
-            return
+            return False
 
-        _, internet_on = self._send_get_request(variables)
+        response, internet_on = self._send_get_request(variables)
 
         if not internet_on:
-            return
+            return False
         
-        # Parser not needed, because the response is not interesting
+        # Parser not needed, because the response is only checked for errors
+        error = self._response_error(response)
+        if error is not None:
+            self.registry.mark_drift(f'siteedit of site {site_id} failed: {error}')
+            return False
         
-        # Edit the new site to the forecast_sites DataFrame
+        # Edit the site in the registry
+        values = {}
         if 'name' in kwargs:
-            self.forecast_sites.at[site_id, 'name'] = kwargs['name']
+            values['name'] = kwargs['name']
 
         if 'position' in kwargs:
-            position = kwargs['position']
-            self.forecast_sites.at[site_id, 'longitude'] = position['longitude']
-            self.forecast_sites.at[site_id, 'latitude'] = position['latitude']
+            values['longitude'] = kwargs['position']['longitude']
+            values['latitude'] = kwargs['position']['latitude']
+
+        self.registry.edit(site_id, **values)
 
         if print_is_requested:
-            print(f'Site with id {site_id} has been edited: {string} \n {self.forecast_sites.at[site_id]}')
+            print(f'Site with id {site_id} has been edited: {string} \n {self.forecast_sites.loc[site_id]}')
 
-    def get_site_delete(self, site_id:int, print_is_requested:bool=False) -> None:
-        """ Call the API to delete a site given the id.
+        return True
+
+    def get_site_delete(self, site_id:int, print_is_requested:bool=False) -> bool:
+        """ Call the API to delete a site given the id. Return whether the site has been deleted.
 
             Inputs:
                 site_id (int): The id of the site to be deleted.
@@ -271,19 +434,25 @@ class MeteotestRequester():
             'action': 'sitedelete',
             'site_id': site_id
         }
-        _, internet_on = self._send_get_request(variables)
+        response, internet_on = self._send_get_request(variables)
         
         if not internet_on:
-            return
+            return False
 
-        # Parser not needed, because the response is not interesting
+        # Parser not needed, because the response is only checked for errors
+        error = self._response_error(response)
+        if error is not None:
+            self.registry.mark_drift(f'sitedelete of site {site_id} failed: {error}')
+            return False
 
-        # Delete the new site to the forecast_sites DataFrame
-        self.forecast_sites.drop(site_id, inplace=True)
+        # Delete the site from the registry
+        self.registry.delete(site_id)
 
         if print_is_requested:
             print(f'Site with id {site_id} has been removed.')
 
+        return True
+
     def get_site_info(self, print_is_requested:bool=False) -> pd.DataFrame:
         """ Call the API to get the information of all sites.
 
@@ -305,6 +474,54 @@ class MeteotestRequester():
 
         return response_df
     
+    def _request_forecast(self, action:str) -> Tuple[pd.DataFrame, pd.Timestamp]:
+        """ Request and parse the forecast of all sites, from the forecast cache if fresh.
+            Return None if there is no internet connection and no cached forecast. The hash of the raw payload is kept in
+            attrs['issuance_digest'], and a payload identical to the previous forecast is not parsed again.
+
+            Inputs:
+                action (str): The forecast action, getforecast or getforecast_cloudmove. """
+
+        variables = {'action': action}
+
+        # The forecasts are polled regularly, which drives the scheduled reconciliation of the registry
+        self.reconcile_sites()
+
+        def fetch() -> pd.DataFrame:
+            response, internet_on = self._send_get_request(variables)
+
+            if not internet_on:
+                return None
+
+            # The payload of the previous issuance is not parsed again
+            digest = self.issuance.digest(response.content)
+            previous_df = self.previous_SF_df if action == 'getforecast' else self.previous_CM_df
+            if previous_df.attrs.get('issuance_digest') == digest:
+                return previous_df
+
+            # Parse the response
+            response_df = self.parser.parse_solar_forecast_response(response, self.forecast_sites, function_tag=action)
+            response_df.attrs['issuance_digest'] = digest
+
+            # Sites forecast by the provider but unknown to the registry, or the other way around, reveal a drift
+            if not response_df.empty and set(response_df.index.unique(level='site_id').tolist()) != self.registry.ids:
+                self.registry.mark_drift(f'the {action} sites differ from the registry')
+
+            return response_df
+
+        if self.cache is None:
+            return fetch(), pd.Timestamp.now(tz=tzlocal())
+
+        # Sites moved with siteedit keep their ids, so the positions are part of the key
+        sites = self.forecast_sites.sort_index()
+        site_positions = tuple(zip(
+            sites.index.tolist(),
+            sites['latitude'].astype(float).round(ForecastCache.COORDINATE_DECIMALS).tolist(),
+            sites['longitude'].astype(float).round(ForecastCache.COORDINATE_DECIMALS).tolist()
+        ))
+        key = ForecastCache.key('meteotest', action, site_id=site_positions)
+        return self.cache.fetch(key, fetch)
+
     @property
     def get_solar_forecast_last_time(self) -> pd.Timestamp:
         """ Return the time of the last solar forecast. """
@@ -316,18 +533,15 @@ class MeteotestRequester():
             Inputs:
                 print_is_requested (bool): Whether to print the result (default: True). """
         
-        variables = {'action': 'getforecast'}
-
-        response, internet_on = self._send_get_request(variables)
+        response_df, retrieved_time = self._request_forecast('getforecast')
 
-        if not internet_on:
+        if response_df is None:
+            self.new_issuance['getforecast'] = False
             return
-        
-        # Parse the response
-        response_df = self.parser.parse_solar_forecast_response(response, self.forecast_sites, function_tag=variables['action'])
 
-        local_tz = tzlocal()
-        self.previous_SF_time = pd.Timestamp.now(tz=local_tz)
+        self.new_issuance['getforecast'] = not response_df.empty and self.issuance.record('getforecast', response_df.attrs.get('issuance_digest'))
+
+        self.previous_SF_time = retrieved_time
         
         if not response_df.empty:
             self.previous_SF_df = response_df
@@ -348,18 +562,15 @@ class MeteotestRequester():
             Inputs:
                 print_is_requested (bool): Whether to print the result (default: True). """
         
-        variables = {'action': 'getforecast_cloudmove'}
-
-        response, internet_on = self._send_get_request(variables)
+        response_df, retrieved_time = self._request_forecast('getforecast_cloudmove')
 
-        if not internet_on:
+        if response_df is None:
+            self.new_issuance['getforecast_cloudmove'] = False
             return
-        
-        # Parse the response
-        response_df = self.parser.parse_solar_forecast_response(response, self.forecast_sites, function_tag=variables['action'])
 
-        local_tz = tzlocal()
-        self.previous_CM_time = pd.Timestamp.now(tz=local_tz)
+        self.new_issuance['getforecast_cloudmove'] = not response_df.empty and self.issuance.record('getforecast_cloudmove', response_df.attrs.get('issuance_digest'))
+
+        self.previous_CM_time = retrieved_time
 
         if not response_df.empty:
             self.previous_CM_df = response_df
@@ -1,26 +1,124 @@
 # Created by Giacomo Mastroddi October 2023
 # https://github.com/Solcast/solcast-api-python-sdk
 
+import os
+import json
+import urllib.error
+import urllib.parse
 import constants
+import numpy as np
 import pandas as pd
 from typing import Tuple
 from dateutil.tz import tzlocal
-from solcast import forecast
+from urllib.request import Request, urlopen
+from solcast.api import Client, PandafiableResponse, Response
+from solcast.urls import base_url, forecast_radiation_and_weather
+from forecast_cache import ForecastCache
+from forecast_cube import ForecastCube
+from request_executor import RequestExecutor
+
+class SolcastClient(Client):
+    """ Solcast SDK client with a timeout on each request. The SDK client waits forever on a stalled connection.
+
+    Attributes:
+        timeout (float): The timeout of each request in seconds. """
+
+    def __init__(self, timeout:float, base_url:str=base_url, endpoint:str=forecast_radiation_and_weather, response_type=PandafiableResponse) -> None:
+        super().__init__(base_url=base_url, endpoint=endpoint, response_type=response_type)
+        self.timeout = timeout
+
+    @staticmethod
+    def _prepare_params(params:dict) -> Tuple[dict, str]:
+        """ Check the parameters and return the query parameters and the API key, which is sent in the header.
+            Raise a ValueError on a missing key or an unsupported format.
+
+            Inputs:
+                params (dict): The parameters of the request, with the api_key (default: the SOLCAST_API_KEY environment variable). """
+        params = dict(params)
+        key = params.pop('api_key', None) or os.getenv('SOLCAST_API_KEY')
+
+        if key is None or len(key) <= 1:
+            raise ValueError('No valid Solcast API key given. Set constants.KEY_SOLCAST or the SOLCAST_API_KEY environment variable.')
+
+        if params.get('format', 'json') != 'json':
+            raise ValueError(f"Only the json format is supported. Received: {params['format']}")
+
+        if isinstance(params.get('output_parameters'), list):
+            params['output_parameters'] = ','.join(params['output_parameters'])
+
+        # Coordinates truncated to 6 decimal places, as the SDK does
+        for coordinate in ['latitude', 'longitude']:
+            if coordinate in params:
+                params[coordinate] = round(float(params[coordinate]), 6)
+
+        return params, key
+
+    def get(self, params:dict) -> Response:
+        """ Make a GET request and return the SDK response. Raise TimeoutError or URLError on connection problems.
+
+            Inputs:
+                params (dict): The parameters of the request, with the api_key. """
+        params, key = self._prepare_params(params)
+        url = f"{self.url}?{urllib.parse.urlencode(params)}"
+        request = Request(url, headers={'Authorization': f'Bearer {key}', 'User-Agent': self.user_agent}, method='GET')
+
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return self.response(code=response.code, url=url, data=response.read(), success=True, exception=None, method='GET')
+
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())['response_status']['message']
+            except Exception:
+                message = 'Undefined Error'
+            return self.response(code=e.code, url=url, data=None, success=False, exception=message, method='GET')
 
 class SolcastExecuter():
     """ Class for interacting with the weather forecast API from Solcast.
 
     Attributes:
-        website (str): The base API URL.
-        format (str): The response format (default: 'json'). """
+        base_url (str): The base API URL (default: BASE_URL).
+        max_workers (int): The maximum number of concurrent requests.
+        timeout (float): The timeout of each request in seconds.
+        failed_sites (dict): The error of each site that failed in the last get_forecasts, by row label.
+        cache (ForecastCache): The on-disk forecast cache, None to always call the API.
+        executor (RequestExecutor): The executor retrying the requests, with the circuit breaker of Solcast.
+        missing_sites (list): The cumDistance of the sites missing in the last get_forecasts.
+        previous_cube (ForecastCube): The last forecasts of get_forecasts, None before the first one. """
 
     KEY: str = constants.KEY_SOLCAST
     FORMAT: str = 'json'
     PERIOD: str = 'PT15M' # Set the period to 15 minutes ISO8601 format
+    OUTPUT_PARAMETERS: str = 'air_temp,ghi,wind_speed_10m,wind_direction_10m,relative_humidity,precipitation_rate'
+    MAX_WORKERS: int = 16 # concurrent requests
+    TIMEOUT: float = 30.0 # in seconds, for each request
+    BASE_URL: str = getattr(constants, 'SOLCAST_URL', base_url) # e.g. the url of a MockProviderServer
+    CACHE_VERSION: int = 2 # format of the cached forecasts: 2 for the (times, values) arrays, before DataFrames
+    COLUMNS: dict = { # Solcast output parameter to forecast column
+        'air_temp': 'tt',
+        'ghi': 'gh',
+        'wind_speed_10m': 'ff',
+        'wind_direction_10m': 'dd',
+        'relative_humidity': 'rh',
+        'precipitation_rate': 'rr'
+    }
+
+    def __init__(self, max_workers:int=None, timeout:float=None, cache:ForecastCache=None, max_retries:int=None, base_url:str=None) -> None:
+        self.max_workers = max_workers if max_workers is not None else self.MAX_WORKERS
+        self.timeout = timeout if timeout is not None else self.TIMEOUT
 
-    def __init__(self) -> None:
-        self.previous_df = pd.DataFrame()
+        if self.max_workers < 1 or self.timeout <= 0:
+            raise ValueError(f'max_workers and timeout have to be positive. Received: {self.max_workers} and {self.timeout}')
+
+        self.base_url = base_url if base_url is not None else self.BASE_URL
+        self.client = SolcastClient(timeout=self.timeout, base_url=self.base_url)
+        self.cache = cache
+        self.executor = RequestExecutor('solcast', max_retries=max_retries, max_workers=self.max_workers)
+
+        self.previous_cube: ForecastCube = None
         self.previous_time: pd.Timestamp = pd.NaT
+        self.failed_sites: dict = {}
+        self.missing_sites: list = []
     
     def _check_variables(self, variables:dict) -> None:
         """ Check if the variables are of the correct type and between the ranges. 
@@ -46,6 +144,82 @@ class SolcastExecuter():
                     if not (min_value <= value <= max_value):
                         raise ValueError(f'{variable} has to be between {min_value} and {max_value}. Received: {value}')
         
+    def _fetch(self, position:dict, hours:int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Request the forecast of a position and parse the JSON records straight into arrays, in the raw Solcast units.
+            Raise an exception if the request fails.
+
+            Inputs:
+                position (dict): The position of the forecast.
+                hours (int): The number of hours in advance to get the forecast.
+
+            Returns:
+                times (np.ndarray): The UTC period_end of each record as int64 nanoseconds.
+                values (np.ndarray): The values with shape (records, output parameters). """
+        response = self.client.get({
+            'latitude': position['latitude'],
+            'longitude': position['longitude'],
+            'output_parameters': self.OUTPUT_PARAMETERS,
+            'format': self.FORMAT,
+            'period': self.PERIOD,
+            'hours': hours,
+            'api_key': self.KEY
+        })
+
+        # Rate limits and server errors are retried, other errors (e.g. wrong key) are not
+        if not response.success and (response.code == 429 or response.code >= 500):
+            raise ConnectionError(f'Solcast request failed with status {response.code}: {response.exception}')
+        if not response.success:
+            raise ValueError(f'Solcast request rejected with status {response.code}: {response.exception}')
+
+        # No content (204) or an empty body is an empty forecast
+        if response.code == 204 or not response.data:
+            records = []
+        else:
+            records = json.loads(response.data).get('forecasts', [])
+        parameters = self.OUTPUT_PARAMETERS.split(',')
+
+        times = pd.to_datetime([record['period_end'] for record in records], utc=True, format='ISO8601').as_unit('ns').asi8
+        values = np.array([[record.get(parameter, np.nan) for parameter in parameters] for record in records], dtype=np.float64).reshape(len(records), len(parameters))
+
+        return times, values
+
+    def _convert_units(self, values:np.ndarray) -> None:
+        """ Convert in place the wind speed to km/h and the precipitation rate to mm per period.
+
+            Inputs:
+                values (np.ndarray): The values with the output parameters on the last axis. """
+        parameters = self.OUTPUT_PARAMETERS.split(',')
+
+        # Convert wind speed to km/h
+        values[..., parameters.index('wind_speed_10m')] *= 3.6
+
+        # Convert precipitation rate to mm
+        values[..., parameters.index('precipitation_rate')] *= int(self.PERIOD.split('T')[1].replace('M', '')) / 60
+
+    @staticmethod
+    def _is_forecast_arrays(forecast) -> bool:
+        """ Return whether a cached forecast is a (times, values) pair of arrays, see _fetch. """
+        return isinstance(forecast, tuple) and len(forecast) == 2 and all(isinstance(array, np.ndarray) for array in forecast)
+
+    def _cached_fetch(self, position:dict, hours:int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Return the forecast arrays of a position from the cache if fresh, otherwise request them with retries.
+            Raise an exception if they are not available.
+
+            Inputs:
+                position (dict): The position of the forecast.
+                hours (int): The number of hours in advance to get the forecast. """
+        if self.cache is None:
+            return self.executor.call(self._fetch, position, hours)
+
+        key = ForecastCache.key('solcast', 'radiation_and_weather', latitude=position['latitude'], longitude=position['longitude'],
+                                period=self.PERIOD, horizon=hours, version=self.CACHE_VERSION)
+        forecast, _ = self.cache.fetch(key, lambda: self.executor.call(self._fetch, position, hours), validate=self._is_forecast_arrays)
+
+        if forecast is None:
+            raise ConnectionError('Solcast forecast not available')
+
+        return forecast
+
     def get_forecast(self, position:dict, checked:bool=False, hours:int=48, print_is_requested:bool=False) -> Tuple[pd.DataFrame, bool]:
         """ Call the Solcast API to get the solar forecast for a specific position.
         
@@ -58,37 +232,29 @@ class SolcastExecuter():
             self._check_variables(position)
 
         try:
-            response = forecast.radiation_and_weather(
-                latitude=position['latitude'],
-                longitude=position['longitude'],
-                output_parameters='air_temp,ghi,wind_speed_10m,wind_direction_10m,relative_humidity,precipitation_rate',
-                format=self.FORMAT,
-                period=self.PERIOD,
-                hours=hours,
-                api_key=constants.KEY_SOLCAST
-            )
+            times, values = self._cached_fetch(position, hours)
 
         except Exception as e:
-            print('No internet connection or another problem')
-            return pd.DataFrame(index='time'), False
+            print(f'No internet connection or another problem: {e}')
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='time')), False
+
+        # The cached arrays are left untouched
+        values = values.copy()
+        self._convert_units(values)
+
+        index = pd.DatetimeIndex(times.astype('datetime64[ns]'), name='time').tz_localize('UTC').tz_convert(constants.TIMEZONE)
+        response_df = pd.DataFrame(values, index=index, columns=self.OUTPUT_PARAMETERS.split(','), copy=False)
         
         if print_is_requested:
             print("Solar forecast Solcast have been retrieved.")
 
-        response_df = response.to_pandas()
-        response_df.index.name = 'time'
-        response_df.index = response_df.index.tz_convert(constants.TIMEZONE)
-
-        # Convert wind speed to km/h
-        response_df['wind_speed_10m'] *= 3.6
-
-        # Convert precipitation rate to mm
-        response_df['precipitation_rate'] *= int(self.PERIOD.split('T')[1].replace('M', '')) / 60
-
         return response_df, True
-    
-    def get_forecasts(self, route_api_df:pd.DataFrame, checked:bool=False, hours_in_advance:int=48, print_is_requested:bool=False) -> pd.DataFrame:
-        """ Call the Solcast API to get the solar forecasts for a specific route.
+
+    def get_forecast_cube(self, route_api_df:pd.DataFrame, checked:bool=False, hours_in_advance:int=48, print_is_requested:bool=False) -> ForecastCube:
+        """ Call the Solcast API to get the solar forecasts for a specific route, assembled into a site × time × variable cube.
+            The sites are requested concurrently with up to max_workers requests in flight and retries, and each response is
+            written into its row of the cube. The sites that failed are left out, reported in failed_sites, and their cumDistance
+            listed in missing_sites.
         
             Inputs:
                 route_api_df (pd.DataFrame): The dataframe with the route information.
@@ -99,42 +265,72 @@ class SolcastExecuter():
         if 'latitude' not in route_api_df.columns or 'longitude' not in route_api_df.columns or 'cumDistance' not in route_api_df.columns:
             raise ValueError('The dataframe has to have latitude, longitude, and cumDistance columns.')
 
-        # Use apply to get forecasts for each row and store in a list
-        forecasts_list = route_api_df.apply(
-            lambda row: self.get_forecast(
-                {'latitude': row['latitude'], 'longitude': row['longitude']}, checked=checked, hours=hours_in_advance,
-                print_is_requested=print_is_requested
-            )[0].assign(cumDistance=row['cumDistance']),
-            axis=1
-        ).tolist()
-
-        if forecasts_list:
-            result_df = pd.concat(forecasts_list)
-
-            # Set and reorder multi-index
-            result_df.set_index('cumDistance', append=True, inplace=True)
-            result_df = result_df.reorder_levels(['cumDistance', 'time'])
-
-            # Rename columns
-            result_df.rename(columns={
-                'air_temp': 'tt',
-                'ghi': 'gh',
-                'wind_speed_10m': 'ff',
-                'wind_direction_10m': 'dd',
-                'relative_humidity': 'rh',
-                'precipitation_rate': 'rr'
-            }, inplace=True)
-
-            # Save the previous time and dataframe
+        sites = [
+            (label, {'latitude': float(latitude), 'longitude': float(longitude)}, cum_distance)
+            for label, latitude, longitude, cum_distance in zip(route_api_df.index, route_api_df['latitude'], route_api_df['longitude'], route_api_df['cumDistance'])
+        ]
+
+        # Check all positions before any request is sent
+        if not checked:
+            for _, position, _ in sites:
+                self._check_variables(position)
+
+        # Results are returned in site order, so completion order does not matter
+        results, failures = self.executor.map(lambda position: self._cached_fetch(position, hours_in_advance), [position for _, position, _ in sites], retry=False)
+
+        self.failed_sites = {sites[i][0]: f'{type(e).__name__}: {e}' for i, e in failures.items()}
+        self.missing_sites = [sites[i][2] for i in sorted(failures)]
+
+        if self.failed_sites:
+            first_error = next(iter(self.failed_sites.values()))
+            print(f'Solcast forecasts of {len(self.failed_sites)} of {len(sites)} sites failed (first error: {first_error}). Missing cumDistance: {self.missing_sites}')
+
+        retrieved = [(cum_distance, result) for (_, _, cum_distance), result in zip(sites, results) if result is not None]
+
+        cube = ForecastCube.from_sites(
+            cum_distance=[cum_distance for cum_distance, _ in retrieved],
+            site_times=[times for _, (times, _) in retrieved],
+            site_values=[values for _, (_, values) in retrieved],
+            variables=[self.COLUMNS[parameter] for parameter in self.OUTPUT_PARAMETERS.split(',')],
+            timezone=constants.TIMEZONE
+        )
+        self._convert_units(cube.values)
+
+        if retrieved:
+            # Save the previous time and cube
             local_tz = tzlocal()
             self.previous_time = pd.Timestamp.now(tz=local_tz)
-            self.previous_df = result_df
+            self.previous_cube = cube
 
         if print_is_requested:
             print("Solar forecasts Solcast have been retrieved.")
 
+        return cube
+
+    def get_forecasts(self, route_api_df:pd.DataFrame, checked:bool=False, hours_in_advance:int=48, print_is_requested:bool=False) -> pd.DataFrame:
+        """ Call the Solcast API to get the solar forecasts for a specific route, with (cumDistance, time) multi-index.
+            The dataframe is a copy of the cube of get_forecast_cube; the cumDistance of the sites without forecast are listed
+            in attrs['missing_sites'].
+        
+            Inputs:
+                route_api_df (pd.DataFrame): The dataframe with the route information.
+                checked (bool): If the variables have been checked (default: False).
+                hours_in_advance (int): The number of hours in advance to get the forecasts (default: 48).
+                print_is_requested (bool): If the print is requested (default: False)."""
+        result_df = self.get_forecast_cube(route_api_df, checked, hours_in_advance, print_is_requested).to_dataframe()
+
+        # Partial result: the sites without forecast are listed explicitly
+        result_df.attrs['missing_sites'] = list(self.missing_sites)
+
         return result_df
 
+    @property
+    def previous_df(self) -> pd.DataFrame:
+        """ Return a copy of the last forecasts of get_forecasts as a dataframe. """
+        if self.previous_cube is None:
+            return pd.DataFrame()
+        return self.previous_cube.to_dataframe()
+
     @property
     def get_solcast_last_time(self) -> pd.Timestamp:
         """ Return the time of the last Solcast solar forecast. """
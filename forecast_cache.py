@@ -0,0 +1,242 @@
+# Created by aCentauri Solar Racing October 2026
+
+import os
+import time
+import zlib
+import pickle
+import hashlib
+import threading
+import constants
+import pandas as pd
+from typing import Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dateutil.tz import tzlocal
+
+class ForecastCache():
+    """ Persistent on-disk cache of provider forecasts. Each entry is a zlib-compressed pickle named after the hash of its key
+        (provider, product, rounded position or site ids, period, horizon). Entries expire after the issuance cadence of the
+        provider and the least recently used ones are evicted when the cache exceeds its size.
+
+    Attributes:
+        directory (str): The folder of the cache.
+        max_size (int): The maximum size of the cache in bytes.
+        stale_while_revalidate (bool): Whether expired entries are served while they are refreshed in the background.
+        refresh_workers (int): The maximum number of background refreshes running at once, the others are queued.
+        hits (int): The number of fresh entries served.
+        stale_hits (int): The number of expired entries served.
+        misses (int): The number of requests sent to the provider. """
+
+    TTLS: dict = { # in seconds, following the issuance cadence of each product
+        ('solcast', 'radiation_and_weather'): 30 * 60,
+        ('meteotest', 'getforecast'): 60 * 60,
+        ('meteotest', 'getforecast_cloudmove'): 15 * 60
+    }
+    DEFAULT_TTL: float = 30 * 60 # in seconds
+    COORDINATE_DECIMALS: int = 3 # about 100 m
+    MAX_SIZE: int = 256 * 1024**2 # in bytes
+    EXTENSION: str = '.pkl.z'
+    REFRESH_WORKERS: int = 2 # background refreshes, kept low so that expiring entries do not flood the provider
+
+    def __init__(self, cache_directory:str=None, max_size:int=None, stale_while_revalidate:bool=False, refresh_workers:int=None) -> None:
+        if cache_directory is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
+            cache_directory = getattr(constants, 'FORECAST_CACHE_DIRECTORY', os.path.join(script_directory, '.forecast_cache'))
+
+        self.directory = cache_directory
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.max_size = max_size if max_size is not None else self.MAX_SIZE
+        self.stale_while_revalidate = stale_while_revalidate
+        self.refresh_workers = refresh_workers if refresh_workers is not None else self.REFRESH_WORKERS
+
+        if self.refresh_workers < 1:
+            raise ValueError(f'refresh_workers has to be positive. Received: {self.refresh_workers}')
+
+        self.hits: int = 0
+        self.stale_hits: int = 0
+        self.misses: int = 0
+
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self._refresh_pool: ThreadPoolExecutor = None
+
+    @classmethod
+    def key(cls, provider:str, product:str, latitude:float=None, longitude:float=None, site_id=None, period:str=None, horizon:int=None, version:int=None) -> tuple:
+        """ Return the key of a forecast. Positions are rounded, so that sites a few meters apart share the entry.
+
+            Inputs:
+                provider (str): The provider, e.g. 'solcast' or 'meteotest'.
+                product (str): The forecast product, e.g. 'radiation_and_weather' or 'getforecast'.
+                latitude (float): The latitude of the site (default: None).
+                longitude (float): The longitude of the site (default: None).
+                site_id: The id of the site, or for products covering all sites a tuple of (id, latitude, longitude) (default: None).
+                period (str): The period of the forecast, e.g. 'PT15M' (default: None).
+                horizon (int): The horizon of the forecast in hours (default: None).
+                version (int): The version of the format of the cached data, changed when the format changes (default: None). """
+        if latitude is not None:
+            latitude = round(float(latitude), cls.COORDINATE_DECIMALS)
+        if longitude is not None:
+            longitude = round(float(longitude), cls.COORDINATE_DECIMALS)
+
+        return (provider, product, latitude, longitude, site_id, period, horizon, version)
+
+    def ttl(self, key:tuple) -> float:
+        """ Return the time to live of the entry in seconds. """
+        return self.TTLS.get(key[:2], self.DEFAULT_TTL)
+
+    def _path(self, key:tuple) -> str:
+        """ Return the file of the entry. """
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + self.EXTENSION)
+
+    def get(self, key:tuple) -> Tuple[object, float]:
+        """ Return the cached data and the time they were stored (Unix time). Return None and NaN if there is no entry.
+
+            Inputs:
+                key (tuple): The key of the forecast, see ForecastCache.key. """
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.loads(zlib.decompress(f.read()))
+        except (FileNotFoundError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None, float('nan')
+
+        # Hash collisions are not served
+        if entry['key'] != key:
+            return None, float('nan')
+
+        # The access time drives the eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return entry['data'], entry['stored']
+
+    def put(self, key:tuple, data:object) -> None:
+        """ Store the data and evict the least recently used entries if the cache is too large.
+
+            Inputs:
+                key (tuple): The key of the forecast, see ForecastCache.key.
+                data (object): The forecast, e.g. a Pandas DataFrame. """
+        path = self._path(key)
+        payload = zlib.compress(pickle.dumps({'key': key, 'stored': time.time(), 'data': data}, protocol=pickle.HIGHEST_PROTOCOL))
+
+        # Written to a temporary file first, so readers never see a partial entry
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temporary_path, path)
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """ Delete the least recently used entries until the cache fits in max_size. """
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(self.EXTENSION):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+
+    def clear(self) -> None:
+        """ Delete all entries. """
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.EXTENSION):
+                os.remove(entry.path)
+
+    def close(self) -> None:
+        """ Cancel the queued background refreshes. The running ones finish in the background. """
+        with self._lock:
+            refresh_pool, self._refresh_pool = self._refresh_pool, None
+        if refresh_pool is not None:
+            refresh_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _refresh(self, key:tuple, fetcher:Callable) -> None:
+        """ Fetch and store the data, ignoring failures. Used for the background revalidation. """
+        try:
+            data = fetcher()
+            if data is not None and not getattr(data, 'empty', False):
+                self.put(key, data)
+        except Exception as e:
+            print(f'Background refresh of {key[:2]} failed: {e}')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def fetch(self, key:tuple, fetcher:Callable, ttl:float=None, validate:Callable=None) -> Tuple[object, pd.Timestamp]:
+        """ Return the cached data if fresh, otherwise fetch them from the provider and store them.
+            Expired data are returned at once when stale_while_revalidate is set, and refreshed by a pool of refresh_workers threads.
+            Expired data are also returned if the provider cannot be reached.
+
+            Inputs:
+                key (tuple): The key of the forecast, see ForecastCache.key.
+                fetcher (Callable): The function requesting the forecast; returns None or raises on failure.
+                    Empty forecasts are not stored.
+                ttl (float): The time to live in seconds (default: the TTL of the provider and product).
+                validate (Callable): The function returning whether cached data have the expected format; other data are a miss
+                    and never served, not even when expired data would be (default: None).
+
+            Returns:
+                data (object): The forecast, None if it could not be retrieved.
+                retrieved_time (pd.Timestamp): The local time at which the forecast was retrieved from the provider. """
+        ttl = self.ttl(key) if ttl is None else ttl
+        data, stored = self.get(key)
+
+        if data is not None and validate is not None and not validate(data):
+            data, stored = None, float('nan')
+
+        if data is not None:
+            if time.time() - stored <= ttl:
+                with self._lock:
+                    self.hits += 1
+                return data, self._timestamp(stored)
+
+            if self.stale_while_revalidate:
+                with self._lock:
+                    self.stale_hits += 1
+                    refresh_is_needed = key not in self._refreshing
+                    self._refreshing.add(key)
+                    if refresh_is_needed and self._refresh_pool is None:
+                        self._refresh_pool = ThreadPoolExecutor(max_workers=self.refresh_workers, thread_name_prefix='forecast_cache_refresh')
+                if refresh_is_needed:
+                    self._refresh_pool.submit(self._refresh, key, fetcher)
+                return data, self._timestamp(stored)
+
+        with self._lock:
+            self.misses += 1
+        try:
+            fresh_data = fetcher()
+        except Exception as e:
+            if data is None:
+                raise
+            print(f'Serving the expired forecast of {key[:2]}: {e}')
+            fresh_data = None
+
+        if fresh_data is None:
+            return data, self._timestamp(stored)
+
+        # Empty forecasts are returned but not stored
+        if getattr(fresh_data, 'empty', False):
+            return fresh_data, pd.Timestamp.now(tz=tzlocal())
+
+        self.put(key, fresh_data)
+        return fresh_data, pd.Timestamp.now(tz=tzlocal())
+
+    @staticmethod
+    def _timestamp(stored:float) -> pd.Timestamp:
+        """ Convert a Unix time to a local timestamp, NaT if NaN. """
+        if stored != stored:
+            return pd.NaT
+        return pd.Timestamp(stored, unit='s', tz='UTC').tz_convert(tzlocal())
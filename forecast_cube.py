@@ -0,0 +1,83 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+import pandas as pd
+
+class ForecastCube():
+    """ Forecasts of several sites on shared axes, stored in one float array values[site, time, variable].
+        Sites are identified by their cumDistance. The (cumDistance, time) Pandas DataFrame is only built on request.
+
+    Attributes:
+        cum_distance (np.ndarray): The cumDistance of the sites in meters.
+        time (pd.DatetimeIndex): The shared time axis.
+        variables (list): The variable names.
+        values (np.ndarray): The forecasts with shape (sites, times, variables), NaN where missing. """
+
+    def __init__(self, cum_distance:np.ndarray, time:pd.DatetimeIndex, variables:list, values:np.ndarray=None) -> None:
+        self.cum_distance = np.asarray(cum_distance, dtype=np.float64)
+        self.time = pd.DatetimeIndex(time, name='time')
+        self.variables = list(variables)
+
+        shape = (len(self.cum_distance), len(self.time), len(self.variables))
+        if values is None:
+            values = np.full(shape, np.nan)
+        elif values.shape != shape:
+            raise ValueError(f'The values have to have shape {shape}. Received: {values.shape}')
+        self.values = values
+
+        self._index: pd.MultiIndex = None
+
+    @classmethod
+    def from_sites(cls, cum_distance:np.ndarray, site_times:list, site_values:list, variables:list, timezone:str) -> 'ForecastCube':
+        """ Assemble the forecasts of each site into one cube. The time axis is the union of the site times,
+            usually the same for all sites, and each site is written with one fancy-indexed assignment.
+
+            Inputs:
+                cum_distance (np.ndarray): The cumDistance of the sites in meters.
+                site_times (list): The UTC times of each site as int64 nanoseconds.
+                site_values (list): The values of each site with shape (times, variables).
+                variables (list): The variable names.
+                timezone (str): The timezone of the time axis. """
+        if site_times:
+            times = np.unique(np.concatenate(site_times))
+        else:
+            times = np.array([], dtype=np.int64)
+
+        cube = cls(cum_distance, pd.DatetimeIndex(times.astype('datetime64[ns]')).tz_localize('UTC').tz_convert(timezone), variables)
+
+        for i, (times_i, values_i) in enumerate(zip(site_times, site_values)):
+            cube.values[i, np.searchsorted(times, times_i)] = values_i
+
+        return cube
+
+    def __len__(self) -> int:
+        return len(self.cum_distance)
+
+    @property
+    def empty(self) -> bool:
+        return self.values.size == 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+    def variable(self, variable:str) -> np.ndarray:
+        """ Return the (sites, times) view of a variable.
+
+            Inputs:
+                variable (str): The variable name. """
+        return self.values[:, :, self.variables.index(variable)]
+
+    def variable_frame(self, variable:str) -> pd.DataFrame:
+        """ Return a variable as a DataFrame with time as index and cumDistance as columns, without unstacking.
+
+            Inputs:
+                variable (str): The variable name. """
+        return pd.DataFrame(self.variable(variable).T, index=self.time, columns=pd.Index(self.cum_distance, name='cumDistance'), copy=True)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ Return the forecasts as a new DataFrame with (cumDistance, time) multi-index and the variables as columns.
+            The values are copied, so the dataframe can be modified without changing the cube. """
+        if self._index is None:
+            self._index = pd.MultiIndex.from_product([self.cum_distance, self.time], names=['cumDistance', 'time'])
+        return pd.DataFrame(self.values.reshape(-1, len(self.variables)), index=self._index, columns=self.variables, copy=True)
@@ -9,6 +9,7 @@ import pandas as pd
 import tkinter as tk
 from tkinter import filedialog
 from route import Route
+from route_matcher import RouteMatcher
 
 class GPS():
     """ Class to get the current location and save the data to a folder of the GPS. """
@@ -19,6 +20,7 @@ class GPS():
         self.new_data_day_df = pd.DataFrame()
         self.ser = serial.Serial(com_port, baudrate=baud, timeout=5)
         self.route = route
+        self.matcher = RouteMatcher(route) if route is not None else None
 
         if choose_specific:
             self.last_save_directory = os.path.dirname(os.path.abspath(__file__))
@@ -115,11 +117,14 @@ class GPS():
             'longitude': longitude_dd
         }
 
+        now = pd.Timestamp.now(tz=constants.TIMEZONE)
+
         # Add the cumulative distance if a route is given
         if self.route is not None:
-            current_position['cumDistance'] = self.route.find_closest_row(current_position)[0]['cumDistance']
+            matched_index, _ = self.matcher.match(current_position, timestamp=now)
+            current_position['cumDistance'] = self.route.route_view.cum_distance[matched_index]
 
-        current_location_df = pd.DataFrame({'time': [pd.Timestamp.now(tz=constants.TIMEZONE)], **current_position})
+        current_location_df = pd.DataFrame({'time': [now], **current_position})
 
         # Concatenate the current location
         self.all_day_df = pd.concat([self.all_day_df, current_location_df])
@@ -0,0 +1,82 @@
+# Created by aCentauri Solar Racing October 2026
+
+import hashlib
+import threading
+import pandas as pd
+from collections import deque
+from dateutil.tz import tzlocal
+
+class IssuanceDetector():
+    """ Detector of new forecast issuances. A product has a new issuance when the issue time given by the provider,
+        or otherwise the hash of its raw payload, differs from the last one. The detection time of each issuance is kept.
+
+    Attributes:
+        history_length (int): The number of issuances kept for each product.
+        history (dict): The (detection time, issuance key) of the last issuances of each product, oldest first. """
+
+    HISTORY_LENGTH: int = 96 # issuances, e.g. a day of 15 minute CloudMove issuances
+
+    def __init__(self, history_length:int=None) -> None:
+        self.history_length = history_length if history_length is not None else self.HISTORY_LENGTH
+
+        if self.history_length < 1:
+            raise ValueError(f'history_length has to be positive. Received: {self.history_length}')
+
+        self.history: dict = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(payload:bytes) -> str:
+        """ Return the hash of a raw payload.
+
+            Inputs:
+                payload (bytes): The raw payload, e.g. the content of the response. """
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def last_key(self, product:str) -> str:
+        """ Return the issuance key of the last issuance of the product, None if there is none.
+
+            Inputs:
+                product (str): The forecast product, e.g. 'getforecast'. """
+        history = self.history.get(product)
+        return history[-1][1] if history else None
+
+    def record(self, product:str, digest:str=None, issue_time:pd.Timestamp=None) -> bool:
+        """ Record the issuance of a product and return whether it is new. The issue time is preferred to the digest.
+
+            Inputs:
+                product (str): The forecast product, e.g. 'getforecast'.
+                digest (str): The hash of the raw payload, see IssuanceDetector.digest (default: None).
+                issue_time (pd.Timestamp): The issue time given by the provider (default: None). """
+        key = str(issue_time) if issue_time is not None else digest
+
+        if key is None:
+            return False
+
+        with self._lock:
+            history = self.history.setdefault(product, deque(maxlen=self.history_length))
+
+            if history and history[-1][1] == key:
+                return False
+
+            history.append((pd.Timestamp.now(tz=tzlocal()), key))
+            return True
+
+    def issuance_times(self, product:str) -> pd.DatetimeIndex:
+        """ Return the detection times of the last issuances of the product.
+
+            Inputs:
+                product (str): The forecast product, e.g. 'getforecast'. """
+        return pd.DatetimeIndex([detected_time for detected_time, _ in self.history.get(product, [])], name='time')
+
+    def issuance_interval(self, product:str) -> pd.Timedelta:
+        """ Return the median time between the issuances of the product, NaT if fewer than two were detected.
+
+            Inputs:
+                product (str): The forecast product, e.g. 'getforecast'. """
+        times = self.issuance_times(product)
+
+        if len(times) < 2:
+            return pd.NaT
+
+        return pd.Series(times).diff().median()
@@ -0,0 +1,320 @@
+# Created by aCentauri Solar Racing October 2026
+
+import os
+import json
+import math
+import time
+import threading
+import constants
+import pandas as pd
+from Meteotest_requester import MeteotestRequester
+
+class MeasurementUplink():
+    """ Background uplink of the pyranometer measurements to Meteotest. The samples of each site are averaged over time buckets,
+        and the closed buckets are sent in batches when max_batch_size buckets are pending or every flush_interval.
+        Each batch is spooled to disk before it is sent and deleted once accepted, so unsent batches survive link outages and
+        restarts and are sent oldest first. Batches rejected by the API are moved to the rejected subfolder instead of blocking
+        the ones behind them. The buckets left when stopping are saved with their sum and count and merged back on the next
+        start, so a bucket is never sent twice with partial means. Adding a sample only takes a lock and never waits for the network.
+
+    Attributes:
+        requester (MeteotestRequester): The requester posting the batches.
+        bucket (pd.Timedelta): The duration over which the samples of a site are averaged.
+        max_batch_size (int): The number of pending buckets triggering a flush, and the maximum number of buckets of a batch.
+        flush_interval (float): The time between flushes in seconds.
+        compress (bool): Whether the batches are sent gzipped.
+        spool_directory (str): The folder of the unsent batches.
+        rejected_directory (str): The folder of the batches rejected by the API, kept for inspection.
+        sent_batches (int): The number of batches accepted by the API.
+        sent_measurements (int): The number of buckets accepted by the API.
+        failed_attempts (int): The number of flushes stopped by a failed request.
+        rejected_batches (int): The number of batches rejected by the API or unreadable.
+        skipped_samples (int): The number of missing or infinite samples left out. """
+
+    BUCKET: str = getattr(constants, 'MEASUREMENT_BUCKET', '10min')
+    MAX_BATCH_SIZE: int = 500 # buckets
+    FLUSH_INTERVAL: float = 60.0 # in seconds
+    MAX_SPOOL_SIZE: int = 64 * 1024**2 # in bytes, the oldest batches are dropped beyond
+    EXTENSION: str = '.json'
+    BUCKETS_FILE: str = 'open_buckets.pending' # buckets left when stopping, not a batch
+
+    def __init__(self, requester:MeteotestRequester, bucket:str=None, max_batch_size:int=None, flush_interval:float=None,
+                 compress:bool=False, spool_directory:str=None) -> None:
+        if spool_directory is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
+            spool_directory = getattr(constants, 'MEASUREMENT_SPOOL_DIRECTORY', os.path.join(script_directory, '.measurement_spool'))
+
+        self.requester = requester
+        self.bucket = pd.Timedelta(bucket if bucket is not None else self.BUCKET)
+        self.max_batch_size = max_batch_size if max_batch_size is not None else self.MAX_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else self.FLUSH_INTERVAL
+        self.compress = compress
+
+        if self.bucket <= pd.Timedelta(0) or self.max_batch_size < 1 or self.flush_interval <= 0:
+            raise ValueError(f'bucket, max_batch_size, and flush_interval have to be positive. Received: {self.bucket}, {self.max_batch_size}, and {self.flush_interval}')
+
+        self.spool_directory = spool_directory
+        self.rejected_directory = os.path.join(spool_directory, 'rejected')
+        os.makedirs(self.rejected_directory, exist_ok=True)
+
+        self.sent_batches: int = 0
+        self.sent_measurements: int = 0
+        self.failed_attempts: int = 0
+        self.rejected_batches: int = 0
+        self.skipped_samples: int = 0
+
+        self._bucket_ns: int = self.bucket.value
+        self._buckets: dict = {} # (site id, bucket start in UTC nanoseconds): [sum, count]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+        self._load_buckets()
+
+    def __enter__(self) -> 'MeasurementUplink':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def pending(self) -> int:
+        """ Return the number of buckets not spooled yet. """
+        return len(self._buckets)
+
+    @property
+    def spooled(self) -> int:
+        """ Return the number of batches waiting on disk. """
+        return len(self._spool_files())
+
+    def _to_nanoseconds(self, sample_time) -> int:
+        """ Return a time as UTC nanoseconds. Times without timezone are in constants.TIMEZONE. """
+        sample_time = pd.Timestamp(sample_time)
+        if sample_time.tz is None:
+            sample_time = sample_time.tz_localize(constants.TIMEZONE)
+        return sample_time.value
+
+    def add(self, site_id:int, gh:float, sample_time:pd.Timestamp=None) -> None:
+        """ Add an irradiance sample.
+
+            Inputs:
+                site_id (int): The id of the Meteotest site.
+                gh (float): The global irradiance in W/m^2.
+                sample_time (pd.Timestamp): The time of the sample (default: now). """
+        # A missing or infinite sample would spoil the mean of its bucket
+        if gh is None or not math.isfinite(gh):
+            self.skipped_samples += 1
+            return
+
+        sample_ns = self._to_nanoseconds(sample_time) if sample_time is not None else time.time_ns()
+        key = (int(site_id), sample_ns - sample_ns % self._bucket_ns)
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = [float(gh), 1]
+            else:
+                bucket[0] += gh
+                bucket[1] += 1
+            batch_is_full = len(self._buckets) >= self.max_batch_size
+
+        if batch_is_full:
+            self._wake.set()
+
+    def add_samples(self, gh_df:pd.DataFrame) -> None:
+        """ Add irradiance samples.
+
+            Inputs:
+                gh_df (pd.DataFrame): The irradiance dataframe with site id and time as index and global irradiance (gh) as columns.
+                    Times without timezone are in constants.TIMEZONE. """
+        times = pd.DatetimeIndex(gh_df.index.get_level_values('time'))
+        if times.tz is None:
+            times = times.tz_localize(constants.TIMEZONE)
+
+        samples_ns = times.as_unit('ns').asi8
+        bucket_starts = samples_ns - samples_ns % self._bucket_ns
+
+        with self._lock:
+            for site_id, bucket_start, gh in zip(gh_df.index.get_level_values('site_id'), bucket_starts.tolist(), gh_df['gh'].to_numpy(dtype=float).tolist()):
+                if not math.isfinite(gh):
+                    self.skipped_samples += 1
+                    continue
+                key = (int(site_id), bucket_start)
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = [gh, 1]
+                else:
+                    bucket[0] += gh
+                    bucket[1] += 1
+            batch_is_full = len(self._buckets) >= self.max_batch_size
+
+        if batch_is_full:
+            self._wake.set()
+
+    def _take_batches(self, force:bool) -> list:
+        """ Remove the closed buckets, or all of them if forced, and return them as batches in the add_measurements format. """
+        now_ns = time.time_ns()
+
+        with self._lock:
+            keys = sorted(key for key in self._buckets if force or key[1] + self._bucket_ns <= now_ns)
+            buckets = [(key, self._buckets.pop(key)) for key in keys]
+
+        batches = []
+        for start in range(0, len(buckets), self.max_batch_size):
+            measurements = {}
+            for (site_id, bucket_start), (total, count) in buckets[start:start + self.max_batch_size]:
+                # Same time format as the forecasts
+                time_string = pd.Timestamp(bucket_start, tz='UTC').strftime('%Y-%m-%d %H:%M:%S')
+                measurements.setdefault(str(site_id), {})[time_string] = {'gh': total / count}
+            batches.append((len(buckets[start:start + self.max_batch_size]), measurements))
+
+        return batches
+
+    def _spool_files(self) -> list:
+        """ Return the spooled batches, oldest first. """
+        return sorted(entry.path for entry in os.scandir(self.spool_directory) if entry.name.endswith(self.EXTENSION))
+
+    def _spool(self, count:int, measurements:dict) -> None:
+        """ Write a batch to the spool, through a temporary file so that a crash never leaves a partial batch. """
+        path = os.path.join(self.spool_directory, f'{time.time_ns():020d}_{count}{self.EXTENSION}')
+
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(measurements, f, separators=(',', ':'), allow_nan=False)
+        os.replace(temporary_path, path)
+
+    def _enforce_spool_size(self) -> None:
+        """ Drop the oldest spooled batches until the spool fits in MAX_SPOOL_SIZE. """
+        paths = self._spool_files()
+        sizes = [os.path.getsize(path) for path in paths]
+        total_size = sum(sizes)
+
+        for path, size in zip(paths, sizes):
+            if total_size <= self.MAX_SPOOL_SIZE:
+                break
+            os.remove(path)
+            total_size -= size
+            print(f'Measurement spool full, dropped {os.path.basename(path)}')
+
+    def _save_buckets(self) -> None:
+        """ Save the remaining buckets with their sum and count, through a temporary file, and empty them. """
+        with self._lock:
+            buckets = [[site_id, bucket_start, total, count] for (site_id, bucket_start), (total, count) in self._buckets.items()]
+            self._buckets.clear()
+
+        path = os.path.join(self.spool_directory, self.BUCKETS_FILE)
+
+        if not buckets:
+            return
+
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(buckets, f, separators=(',', ':'), allow_nan=False)
+        os.replace(temporary_path, path)
+
+    def _load_buckets(self) -> None:
+        """ Merge the buckets saved when stopping back in, so that their samples are averaged with the new ones. """
+        path = os.path.join(self.spool_directory, self.BUCKETS_FILE)
+
+        try:
+            with open(path, 'r') as f:
+                buckets = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            self._reject(path)
+            return
+
+        with self._lock:
+            for site_id, bucket_start, total, count in buckets:
+                bucket = self._buckets.setdefault((int(site_id), int(bucket_start)), [0.0, 0])
+                bucket[0] += total
+                bucket[1] += count
+
+        os.remove(path)
+
+    def _reject(self, path:str) -> None:
+        """ Move a batch out of the spool, so that it does not block the ones behind it. """
+        os.replace(path, os.path.join(self.rejected_directory, os.path.basename(path)))
+        self.rejected_batches += 1
+        print(f'Measurement batch {os.path.basename(path)} rejected, moved to {self.rejected_directory}')
+
+    def _send_spooled(self) -> None:
+        """ Send the spooled batches oldest first, stopping at the first link failure to keep the order. """
+        for path in self._spool_files():
+            try:
+                with open(path, 'r') as f:
+                    measurements = json.load(f)
+            except ValueError:
+                self._reject(path)
+                continue
+
+            accepted, internet_on = self.requester.post_measurements(measurements, compress=self.compress)
+
+            if not internet_on:
+                self.failed_attempts += 1
+                return
+
+            if not accepted:
+                self._reject(path)
+                continue
+
+            os.remove(path)
+            self.sent_batches += 1
+            self.sent_measurements += int(os.path.basename(path)[:-len(self.EXTENSION)].split('_')[1])
+
+    def flush(self, force:bool=False) -> None:
+        """ Spool the closed buckets and send the spooled batches. Called by the background thread; blocks on the network.
+
+            Inputs:
+                force (bool): Whether to spool the open buckets too, e.g. before stopping (default: False). """
+        with self._flush_lock:
+            batches = self._take_batches(force)
+            for count, measurements in batches:
+                self._spool(count, measurements)
+
+            if batches:
+                self._enforce_spool_size()
+
+            self._send_spooled()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Measurement uplink flush failed: {type(e).__name__}: {e}')
+
+    def start(self) -> 'MeasurementUplink':
+        """ Start the background thread. The batches spooled before a restart are sent at once. """
+        self._load_buckets()
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._wake.set()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, flush:bool=True, timeout:float=None) -> None:
+        """ Stop the background thread. The closed buckets are spooled, and sent if the link is up. The open buckets are
+            saved and merged back on the next start, also of a new uplink on the same spool after a restart.
+
+            Inputs:
+                flush (bool): Whether to spool and send the closed buckets, otherwise they are saved with the open ones (default: True).
+                timeout (float): The maximum wait for the thread in seconds (default: None). """
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        if flush:
+            self.flush()
+
+        self._save_buckets()
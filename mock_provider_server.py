@@ -0,0 +1,307 @@
+# Created by aCentauri Solar Racing October 2026
+
+import os
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class MockHTTPServer(ThreadingHTTPServer):
+    """ Threading HTTP server with a listen backlog large enough for the concurrent clients. With the default of 5,
+        extra connections wait for SYN retransmissions of about 1 s, which distorts the concurrency being tested. """
+
+    request_queue_size: int = 128
+    daemon_threads: bool = True
+
+class MockProviderServer():
+    """ Local stand-in for the forecast providers, to exercise the fetch, parse and preprocess pipeline offline.
+        Imitates the Meteotest mdx api_v1 actions (siteinfo, siteadd, siteedit, sitedelete, getforecast, getforecast_cloudmove,
+        add_measurements) and the Solcast radiation_and_weather endpoint, with synthetic or recorded payloads.
+        Point MeteotestRequester(website=server.meteotest_url) and SolcastExecuter(base_url=server.solcast_url) at it.
+
+    Attributes:
+        latency (float): The delay of each response in seconds.
+        error_rate (float): The probability of answering 503 instead of the payload.
+        recorded_directory (str): The folder with recorded payloads named <action>.json or radiation_and_weather.json (default: None).
+        sites (dict): The Meteotest sites by id.
+        measurements (list): The received measurement uploads.
+        request_counts (dict): The number of requests by action. """
+
+    START: dict = {'latitude': -12.46, 'longitude': 130.84} # Darwin
+    END: dict = {'latitude': -34.93, 'longitude': 138.60} # Adelaide
+    FIRST_SITE_ID: int = 100000
+    UTC_OFFSET: str = 'UTC+9.5'
+    METEOTEST_FORECASTS: dict = { # action: (hours, period in minutes, columns)
+        'getforecast': (72, 60, ['gh', 'tt', 'rh', 'ff', 'dd', 'fx', 'rr']),
+        'getforecast_cloudmove': (6, 15, ['gh', 'tt'])
+    }
+    SOLCAST_PATH: str = '/data/forecast/radiation_and_weather'
+    METEOTEST_PATH: str = '/api_v1'
+
+    def __init__(self, latency:float=0.0, error_rate:float=0.0, number_sites:int=0, recorded_directory:str=None,
+                 host:str='127.0.0.1', port:int=0, seed:int=None) -> None:
+        if latency < 0 or not (0.0 <= error_rate <= 1.0) or number_sites < 0:
+            raise ValueError(f'latency and number_sites have to be non-negative and error_rate between 0 and 1. Received: {latency}, {number_sites}, {error_rate}')
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.recorded_directory = recorded_directory
+        self.random = random.Random(seed)
+
+        self.sites: dict = {}
+        self.measurements: list = []
+        self.request_counts: dict = {}
+        self.next_site_id = self.FIRST_SITE_ID
+        self.lock = threading.Lock()
+
+        # Initial sites evenly spread between Darwin and Adelaide
+        for i, fraction in enumerate(np.linspace(0.0, 1.0, number_sites)):
+            self._add_site(str(i),
+                           self.START['latitude'] + fraction * (self.END['latitude'] - self.START['latitude']),
+                           self.START['longitude'] + fraction * (self.END['longitude'] - self.START['longitude']))
+
+        server = self
+        class Handler(MockProviderHandler):
+            provider_server = server
+
+        self.httpd = MockHTTPServer((host, port), Handler)
+        self.thread: threading.Thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def meteotest_url(self) -> str:
+        return self.url + self.METEOTEST_PATH
+
+    @property
+    def solcast_url(self) -> str:
+        return self.url
+
+    def start(self) -> 'MockProviderServer':
+        """ Serve in a background thread. """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """ Stop serving and close the socket. """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'MockProviderServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _add_site(self, name:str, latitude:float, longitude:float) -> int:
+        site_id = self.next_site_id
+        self.next_site_id += 1
+        self.sites[site_id] = {'name': name, 'latitude': float(latitude), 'longitude': float(longitude), 'altitude': 0, 'utc_offset': self.UTC_OFFSET}
+        return site_id
+
+    def _recorded(self, name:str) -> dict:
+        """ Return the recorded payload, None if there is none. """
+        if self.recorded_directory is None:
+            return None
+
+        path = os.path.join(self.recorded_directory, f'{name}.json')
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _weather(latitude:np.ndarray, times:pd.DatetimeIndex) -> dict:
+        """ Return smooth synthetic weather with shape (sites, times): a clear-sky-like irradiance and a daily temperature cycle. """
+        local_hours = np.asarray((times.hour + times.minute / 60 + 9.5) % 24, dtype=np.float64)
+        daylight = np.clip(np.sin((local_hours - 6.0) / 12.0 * np.pi), 0.0, None)[np.newaxis, :]
+        south = (np.abs(latitude)[:, np.newaxis] - 12.0) / 25.0
+        shape = (len(latitude), len(times))
+
+        return {
+            'gh': np.round(1000.0 * daylight * (1.0 - 0.2 * south), 1),
+            'tt': np.round(22.0 + 10.0 * daylight - 8.0 * south, 1),
+            'rh': np.round(np.broadcast_to(30.0 + 20.0 * south, shape), 1),
+            'ff': np.round(np.broadcast_to(4.0 + 2.0 * south, shape), 1),
+            'dd': np.round(np.broadcast_to(120.0 + 60.0 * south, shape), 0),
+            'fx': np.round(np.broadcast_to(7.0 + 3.0 * south, shape), 1),
+            'rr': np.zeros(shape)
+        }
+
+    def meteotest_forecast(self, action:str) -> dict:
+        """ Return the payload of getforecast or getforecast_cloudmove for all sites. """
+        recorded = self._recorded(action)
+        if recorded is not None:
+            return recorded
+
+        hours, period, columns = self.METEOTEST_FORECASTS[action]
+        start = pd.Timestamp.now(tz='UTC').floor(f'{period}min')
+        times = pd.date_range(start, periods=hours * 60 // period, freq=f'{period}min')
+        time_strings = times.strftime('%Y-%m-%d %H:%M:%S')
+
+        with self.lock:
+            sites = dict(self.sites)
+
+        site_ids = list(sites)
+        weather = self._weather(np.array([sites[site_id]['latitude'] for site_id in site_ids]), times)
+
+        forecast = {
+            str(site_id): {
+                time_string: {column: float(weather[column][i, j]) for column in columns}
+                for j, time_string in enumerate(time_strings)
+            }
+            for i, site_id in enumerate(site_ids)
+        }
+
+        return {'status': 'OK', 'payload': {'solarforecast': forecast}}
+
+    def solcast_forecast(self, latitude:float, hours:int, period:str, output_parameters:list) -> dict:
+        """ Return the payload of radiation_and_weather for a position. """
+        recorded = self._recorded('radiation_and_weather')
+        if recorded is not None:
+            return recorded
+
+        minutes = int(period.split('T')[1].replace('M', ''))
+        times = pd.date_range(pd.Timestamp.now(tz='UTC').ceil(f'{minutes}min'), periods=hours * 60 // minutes, freq=f'{minutes}min')
+        weather = self._weather(np.array([latitude]), times)
+
+        values = {
+            'air_temp': weather['tt'][0],
+            'ghi': weather['gh'][0],
+            'wind_speed_10m': weather['ff'][0] / 3.6,
+            'wind_direction_10m': weather['dd'][0],
+            'relative_humidity': weather['rh'][0],
+            'precipitation_rate': weather['rr'][0]
+        }
+
+        forecasts = [
+            {'period_end': time.strftime('%Y-%m-%dT%H:%M:%SZ'), 'period': period,
+             **{parameter: float(values[parameter][j]) for parameter in output_parameters if parameter in values}}
+            for j, time in enumerate(times)
+        ]
+
+        return {'forecasts': forecasts}
+
+    def meteotest_action(self, action:str, variables:dict) -> dict:
+        """ Apply a Meteotest action and return its payload. """
+        if action in self.METEOTEST_FORECASTS:
+            return self.meteotest_forecast(action)
+
+        with self.lock:
+            if action == 'siteinfo':
+                return {'status': 'OK', 'payload': {'solarforecast': {'sites': {str(site_id): site for site_id, site in self.sites.items()}}}}
+
+            if action == 'siteadd':
+                site_id = self._add_site(variables.get('name', ''), float(variables['latitude']), float(variables['longitude']))
+                return {'status': 'OK', 'payload': {'solarforecast': {'site': {'id': str(site_id), **self.sites[site_id]}}}}
+
+            site_id = int(variables.get('site_id', -1))
+
+            if action == 'siteedit' and site_id in self.sites:
+                for variable in ['name', 'latitude', 'longitude']:
+                    if variable in variables:
+                        self.sites[site_id][variable] = variables[variable] if variable == 'name' else float(variables[variable])
+                return {'status': 'OK', 'payload': {}}
+
+            if action == 'sitedelete' and site_id in self.sites:
+                del self.sites[site_id]
+                return {'status': 'OK', 'payload': {}}
+
+            if action == 'add_measurements':
+                self.measurements.append(variables.get('measurements'))
+                return {'status': 'OK', 'payload': {}}
+
+        return {'status': f'Error: unknown action {action} or site_id {site_id}', 'payload': {}}
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    """ Request handler of the MockProviderServer. """
+
+    provider_server: MockProviderServer = None
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send_json(self, status:int, payload:dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, variables:dict, path:str) -> None:
+        server = self.provider_server
+        action = variables.get('action', 'radiation_and_weather' if path == server.SOLCAST_PATH else path)
+
+        with server.lock:
+            server.request_counts[action] = server.request_counts.get(action, 0) + 1
+            fails = server.random.random() < server.error_rate
+
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        if fails:
+            self._send_json(503, {'response_status': {'message': 'Service unavailable (mock error)'}, 'status': 'error'})
+            return
+
+        if path == server.METEOTEST_PATH:
+            self._send_json(200, server.meteotest_action(action, variables))
+
+        elif path == server.SOLCAST_PATH:
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                self._send_json(401, {'response_status': {'message': 'Missing API key'}})
+                return
+            output_parameters = variables.get('output_parameters', 'ghi,air_temp').split(',')
+            self._send_json(200, server.solcast_forecast(float(variables['latitude']), int(variables.get('hours', 48)),
+                                                         variables.get('period', 'PT30M'), output_parameters))
+
+        else:
+            self._send_json(404, {'response_status': {'message': f'Unknown path {path}'}})
+
+    def _handle_safely(self, variables:dict, path:str) -> None:
+        """ Answer 500 with the error instead of dropping the connection. """
+        try:
+            self._handle(variables, path)
+        except Exception as e:
+            self._send_json(500, {'response_status': {'message': f'{type(e).__name__}: {e}'}, 'status': 'error'})
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        variables = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self._handle_safely(variables, url.path.rstrip('/'))
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        body = body.decode()
+        variables = {key: values[0] for key, values in parse_qs(body).items()}
+        variables.update({key: values[0] for key, values in parse_qs(url.query).items()})
+        self._handle_safely(variables, url.path.rstrip('/'))
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Local mock of the Meteotest and Solcast forecast APIs.')
+    argument_parser.add_argument('--host', default='127.0.0.1')
+    argument_parser.add_argument('--port', type=int, default=8080)
+    argument_parser.add_argument('--latency', type=float, default=0.0, help='delay of each response in seconds')
+    argument_parser.add_argument('--error-rate', type=float, default=0.0, help='probability of a 503 response')
+    argument_parser.add_argument('--sites', type=int, default=0, help='number of initial Meteotest sites')
+    argument_parser.add_argument('--recorded', default=None, help='folder with recorded payloads')
+    arguments = argument_parser.parse_args()
+
+    mock_server = MockProviderServer(latency=arguments.latency, error_rate=arguments.error_rate, number_sites=arguments.sites,
+                                     recorded_directory=arguments.recorded, host=arguments.host, port=arguments.port)
+    print(f'Meteotest: {mock_server.meteotest_url}\nSolcast: {mock_server.solcast_url}')
+    mock_server.httpd.serve_forever()
@@ -1,23 +1,43 @@
 # Created by Giacomo Mastroddi October 2023
 
 import folium
+import numpy as np
 import pandas as pd
 from route import Route
+from stop_index import StopIndex
 
 class Plotter():
     """ Class to plot the route and the current position in a folium map."""
 
-    def __init__(self, route:Route) -> None:
+    ROUTE_TOLERANCE: float = 25.0 # in meters, maximum distance of the drawn route from the full route
+
+    def __init__(self, route:Route, route_tolerance:float=None) -> None:
+        if route_tolerance is None:
+            route_tolerance = self.ROUTE_TOLERANCE
+        self.route_tolerance = route_tolerance
+
+        self.set_route(route)
+
+    def set_route(self, route:Route) -> None:
+        """ Switch to another route, e.g. a detour from the route registry. A new map is drawn for the route,
+            so the markers of the previous route (API sites, control stops, positions) have to be added again.
+
+            Inputs:
+                route (Route): The new route. """
         self.route = route
-        self.route_data = self.route.get_route_data
         self.control_stops = pd.DataFrame() # Consider possibility of not having control stops
+        self.control_stops_index: StopIndex = None
         self.start_position = None
         self.end_position = None
 
-        min_lng = self.route_data['longitude'].min()
-        min_lat = self.route_data['latitude'].min()
-        max_lng = self.route_data['longitude'].max()
-        max_lat = self.route_data['latitude'].max()
+        # Bounds from the route arrays, without building the route dataframe
+        latitude = self.route.route_view.column('latitude')
+        longitude = self.route.route_view.column('longitude')
+
+        min_lng = float(longitude.min())
+        min_lat = float(latitude.min())
+        max_lng = float(longitude.max())
+        max_lat = float(latitude.max())
 
         # Create a base map centered around the midle of the route
         middle_lat = (max_lat + min_lat) / 2
@@ -35,8 +55,11 @@ class Plotter():
         self.map.options['maxBoundsViscosity'] = 0.9
         self.map.options['minZoom'] = 5
 
+        # Draw the coarsest simplified route that is still accurate enough
+        simplified_route = self.route.get_simplified_route(self.route_tolerance)
+
         folium.PolyLine(
-            locations=self.route_data[['latitude', 'longitude']].values.tolist(),
+            locations=simplified_route[['latitude', 'longitude']].values.tolist(),
             color="green",
             weight=4,
             opacity=1
@@ -64,6 +87,7 @@ class Plotter():
         """ Add the control stops to the map."""
         # Save control stops dataframe without first and last row
         self.control_stops = control_stops_df.iloc[1:-1]
+        self.control_stops_index = StopIndex(self.control_stops)
         self.start_position = control_stops_df.iloc[0]
         self.end_position = control_stops_df.iloc[-1]
 
@@ -97,41 +121,35 @@ class Plotter():
 
     def _recursive_position_finder(self, current_cumDistance:float, driving_time:float, cs_to_skip:int) -> pd.Series:
         """ Recursively find the position at the end of the driving time considering the control stops."""
-        # Cut data at current position (lower cut)
-        cut_data = self.route_data.copy()
+        route_view = self.route.route_view
 
-        cut_data = cut_data[cut_data['cumDistance'] >= current_cumDistance]
-        cut_data = cut_data.reset_index(drop=True)
-
-        current_time = cut_data['cumTimeAtMaxSpeedLim'][0]
+        # Stop cases
+        # Reach end of route, return last point
+        if current_cumDistance >= route_view.cum_distance_max:
+            return route_view.record(route_view.length - 1) # return self.end_position
 
-        # Cut data at driving time (upper cut)
-        cut_data = cut_data[cut_data['cumTimeAtMaxSpeedLim'] <= current_time + driving_time]
-        max_cumDistance = cut_data['cumDistance'].max()
+        # Last vertex reached within the driving time, found on the prefix sums without copying the route
+        end_index = self.route.route_ranges.index_after_time(current_cumDistance, driving_time)
+        max_cumDistance = route_view.cum_distance[end_index]
 
         # Check if the control stop dataframe is not empty
-        if not self.control_stops.empty:
-            cs_in_range_mask = (self.control_stops['cumDistance'] >= current_cumDistance) & (self.control_stops['cumDistance'] <= max_cumDistance)
-            cs_in_range = cs_in_range_mask.sum()
+        cs_in_range = 0
+        if self.control_stops_index is not None and len(self.control_stops_index) > 0:
+            cs_in_range = int(self.control_stops_index.count_within(current_cumDistance, max_cumDistance)[0])
             print(f'cs found ahead: {cs_in_range}')
             print(f'cs to skip: {cs_to_skip}')
         else:
             print("No control stop dataframe given")
-
-        # Stop cases
-        # Reach end of route, return last point
-        if current_cumDistance >= self.route_data.iloc[-1]['cumDistance']:
-            return self.route_data.iloc[-1] # return self.end_position
         
         # All control stops considered
         if cs_to_skip == cs_in_range:
             print("All control stops considered")
-            return self.route_data.loc[self.route_data['cumDistance'] == max_cumDistance].iloc[0]
+            return route_view.record(np.searchsorted(route_view.cum_distance, max_cumDistance, side='left'))
         
         # Stop at control stop for the night, meaning we arrive at cs between 16:30 and 17:00
         if cs_to_skip > cs_in_range:
             print("Stop at control stop for the night")
-            return self.control_stops.loc[self.control_stops['cumDistance'] > current_cumDistance].iloc[cs_to_skip - 1]
+            return self.control_stops_index.record(self.control_stops_index.next(current_cumDistance, offset=cs_to_skip - 1)[0])
         
 
         # Recursive call to skip control stop and reduce driving time by 30 minutes
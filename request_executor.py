@@ -0,0 +1,205 @@
+# Created by aCentauri Solar Racing October 2026
+
+import time
+import random
+import threading
+from typing import Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+class CircuitOpenError(ConnectionError):
+    """ Raised instead of sending a request while the circuit breaker of the provider is open. """
+
+class CircuitBreaker():
+    """ Circuit breaker of a provider. After failure_threshold consecutive failures the circuit opens and requests fail at once;
+        after reset_timeout one trial request is let through (half-open) and closes the circuit if it succeeds.
+
+    Attributes:
+        failure_threshold (int): The number of consecutive failures opening the circuit.
+        reset_timeout (float): The time before a trial request in seconds.
+        failures (int): The number of consecutive failures.
+        opened_time (float): The monotonic time at which the circuit opened, None if closed. """
+
+    def __init__(self, failure_threshold:int=10, reset_timeout:float=30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures: int = 0
+        self.opened_time: float = None
+        self._trial_in_flight: bool = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """ Return closed, open or half-open. """
+        if self.opened_time is None:
+            return 'closed'
+        if time.monotonic() - self.opened_time >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """ Return whether a request can be sent. Only one trial request is let through while half-open. """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_time = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """ Let another trial request through after a trial ended with an error that says nothing about the connection. """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_time = time.monotonic()
+            self._trial_in_flight = False
+
+class RateLimiter():
+    """ Token bucket limiting the rate of requests shared by several threads.
+
+    Attributes:
+        rate (float): The sustained rate in requests per second.
+        burst (int): The number of requests that can be sent at once after an idle period. """
+
+    def __init__(self, rate:float, burst:int=1) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError(f'rate and burst have to be positive. Received: {rate} and {burst}')
+
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens: float = float(burst)
+        self._updated_time: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """ Wait until a request can be sent. """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_time) * self.rate)
+                self._updated_time = now
+
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+
+                delay = (1.0 - self._tokens) / self.rate
+
+            time.sleep(delay)
+
+class RequestExecutor():
+    """ Shared executor of provider requests: retries with jittered exponential backoff, a circuit breaker per provider,
+        and concurrent batches returning partial results with the failed items.
+
+    Attributes:
+        provider (str): The provider name, e.g. 'solcast' or 'meteotest'. The circuit breaker is shared by provider.
+        max_retries (int): The number of retries of each request after the first attempt.
+        base_delay (float): The backoff delay before the first retry in seconds, doubled at each retry.
+        max_delay (float): The maximum backoff delay in seconds.
+        max_workers (int): The maximum number of concurrent requests in a batch.
+        rate_limiter (RateLimiter): The limiter of the request rate, applied to each attempt, None if unlimited.
+        breaker (CircuitBreaker): The circuit breaker of the provider. """
+
+    MAX_RETRIES: int = 3
+    BASE_DELAY: float = 0.5 # in seconds
+    MAX_DELAY: float = 8.0 # in seconds
+    MAX_WORKERS: int = 16
+    RETRYABLE_EXCEPTIONS: tuple = (OSError,) # connection errors, timeouts, and requests and urllib errors
+
+    _breakers: dict = {}
+    _breakers_lock = threading.Lock()
+
+    def __init__(self, provider:str, max_retries:int=None, base_delay:float=None, max_delay:float=None, max_workers:int=None, rate_limit:float=None) -> None:
+        self.provider = provider
+        self.max_retries = max_retries if max_retries is not None else self.MAX_RETRIES
+        self.base_delay = base_delay if base_delay is not None else self.BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else self.MAX_DELAY
+        self.max_workers = max_workers if max_workers is not None else self.MAX_WORKERS
+
+        if self.max_retries < 0 or self.max_workers < 1:
+            raise ValueError(f'max_retries has to be non-negative and max_workers positive. Received: {self.max_retries} and {self.max_workers}')
+
+        self.rate_limiter = RateLimiter(rate_limit, burst=max(int(rate_limit), 1)) if rate_limit is not None else None
+        self.breaker = self.circuit_breaker(provider)
+
+    @classmethod
+    def circuit_breaker(cls, provider:str) -> CircuitBreaker:
+        """ Return the circuit breaker of the provider, shared by all executors of the provider. """
+        with cls._breakers_lock:
+            return cls._breakers.setdefault(provider, CircuitBreaker())
+
+    def _backoff(self, attempt:int) -> float:
+        """ Return the delay before the retry with full jitter: uniform between 0 and the exponential delay. """
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(self, function:Callable, *args, **kwargs):
+        """ Call the function, retrying on connection errors. Raise CircuitOpenError if the provider circuit is open,
+            and the last exception once the retries are exhausted. Other exceptions are raised at once.
+
+            Inputs:
+                function (Callable): The request function.
+                *args, **kwargs: The arguments of the function. """
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f'The circuit of {self.provider} is open after {self.breaker.failures} consecutive failures.')
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                result = function(*args, **kwargs)
+            except self.RETRYABLE_EXCEPTIONS:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+            except Exception:
+                # e.g. a rejected request: neither a success nor a connection failure, but the trial is over
+                self.breaker.release_trial()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def map(self, function:Callable, items:list, retry:bool=True) -> Tuple[list, dict]:
+        """ Call the function on each item concurrently, each call with its own retries.
+
+            Inputs:
+                function (Callable): The request function taking one item.
+                items (list): The items, e.g. site positions.
+                retry (bool): Whether each call goes through call, False if the function already retries (default: True).
+
+            Returns:
+                results (list): The result of each item in the input order, None for the failed items.
+                failures (dict): The exception of each failed item by position in the input list. """
+        items = list(items)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(items), 1))) as executor:
+            if retry:
+                futures = [executor.submit(self.call, function, item) for item in items]
+            else:
+                futures = [executor.submit(function, item) for item in items]
+
+        results = []
+        failures = {}
+        for i, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(None)
+                failures[i] = e
+
+        return results, failures
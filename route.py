@@ -2,82 +2,119 @@
 
 import os
 import constants
+import numpy as np
 import pandas as pd
 import tkinter as tk
 from typing import Tuple
 from tkinter import filedialog
-from scipy.spatial import KDTree
+from route_cache import RouteCache
+from route_view import RouteView, RouteRecord
+from route_ranges import RouteRanges
+from stop_index import StopIndex
 
 class Route():
     """ Import the route data from the csv file and generate a Pandas DataFrame. 
     
         Args:
             choose_specific_route (bool): If True, a file dialog will open to allow the user to choose a specific route file. 
-                If False, the route file specified in constants.py will be used. Defaults to False. """
+                If False, the route file specified in constants.py will be used. Defaults to False.
+            route_file, control_stops_file, camping_file (str): The csv files to be used without dialog instead of
+                the ones in constants.py. Defaults to None. """
     
-    def __init__(self, choose_specific:bool=False) -> None:
-        # Upload route data
-        if choose_specific:
-            root = tk.Tk()
-            root.withdraw()  # Hide the main window
-            root.lift()  # Bring the window to the front
-            root.attributes('-topmost', True)  # Keep the window on top of all others
+    OFF_ROUTE_DISTANCE: float = 200.0 # in meters
+
+    # Columns returned by state_at, if present in the route data
+    STATE_COLUMNS: list = ['latitude', 'longitude', 'altitude', 'altitudeSmoothed', 'theta', 'inclination', 'inclinationSmoothed', 'cumTimeAtMaxSpeedLim']
+    STATE_STEP_COLUMNS: list = ['maxSpeed']
+    STATE_ANGLE_COLUMNS: list = ['theta']
+
+    def __init__(self, choose_specific:bool=False, route_file:str=None, control_stops_file:str=None, camping_file:str=None) -> None:
+        # Files are only looked up if not given explicitly (e.g. by the route registry)
+        if route_file is None and choose_specific:
+            # Choose route data, control stops and camping data
+            route_file = self._ask_csv_file('Select the csv route file')
+            control_stops_file = self._ask_csv_file('Select the csv file with control stops')
+            camping_file = self._ask_csv_file('Select the csv file with camping data')
+        
+        elif route_file is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
+            route_file = os.path.join(script_directory, constants.ROUTE)
+            control_stops_file = os.path.join(script_directory, constants.CONTROL_STOPS)
+            camping_file = os.path.join(script_directory, constants.CAMPING)
 
-            chosen_file = filedialog.askopenfilename(title='Select the csv route file', filetypes=[("CSV files", "*.csv")])
+        if not route_file:
+            raise ValueError('No route file chosen. Data not read.')
 
-            if chosen_file:
-                self.route_df = pd.read_csv(chosen_file)
-                print(f"Data read from {chosen_file}.")
-            else:
-                print("No directory chosen. Data not read.")
-            
-            # Upload control stops
-            root = tk.Tk()
-            root.withdraw()  # Hide the main window
-            root.lift()  # Bring the window to the front
-            root.attributes('-topmost', True)  # Keep the window on top of all others
+        self.control_stops_file = control_stops_file
+        self.camping_file = camping_file
 
-            chosen_file = filedialog.askopenfilename(title='Select the csv file with control stops', filetypes=[("CSV files", "*.csv")])
+        # Upload the compiled route, rebuilt only if a csv file changed
+        self.route_cache = RouteCache(route_file, control_stops_file, camping_file)
+        tables = self.route_cache.load(print_is_requested=True)
 
-            if chosen_file:
-                self.control_stops_df = pd.read_csv(chosen_file)
-                print(f"Data read from {chosen_file}.")
-            else:
-                print("No directory chosen. Data not read.")
+        # Array-backed route, the DataFrame is only built on request
+        self.route_view = RouteView(tables['route'])
+        self.control_stops_df = pd.DataFrame(tables['control_stops'])
+        self.camping_df = pd.DataFrame(tables['camping'])
+        self._build_stop_indices()
 
-            # Upload camping
-            root = tk.Tk()
-            root.withdraw()  # Hide the main window
-            root.lift()  # Bring the window to the front
-            root.attributes('-topmost', True)  # Keep the window on top of all others
+        # Prefix sums for range queries
+        self.route_ranges = RouteRanges(self.route_view)
 
-            chosen_file = filedialog.askopenfilename(title='Select the csv file with camping data', filetypes=[("CSV files", "*.csv")])
+        # Spatial index for searching, owned by the route (the route registry shares it between routes on the same coordinates)
+        self.route_index = tables['route_index']
 
-            if chosen_file:
-                self.camping_df = pd.read_csv(chosen_file)
-                print(f"Data read from {chosen_file}.")
-            else:
-                print("No directory chosen. Data not read.")
-        
-        else:
-            # Upload route data
-            script_directory = os.path.dirname(os.path.abspath(__file__))
-            csv_file_path = os.path.join(script_directory, constants.ROUTE)
-            self.route_df = pd.read_csv(csv_file_path)
+        # Level-of-detail geometries: tolerance in meters -> indices of the kept route vertices
+        self.simplified_indices = tables['simplified']
 
-            # Upload control stops
-            script_directory = os.path.dirname(os.path.abspath(__file__))
-            csv_file_path = os.path.join(script_directory, constants.CONTROL_STOPS)
-            self.control_stops_df = pd.read_csv(csv_file_path)
+        # Validation rules with precomputed bounds
+        self.validation_rules = {
+            'latitude': (float, constants.GEO['latitude']['min'], constants.GEO['latitude']['max']),
+            'longitude': (float, constants.GEO['longitude']['min'], constants.GEO['longitude']['max']),
+            'cumDistance': ((float, int), self.route_view.cum_distance_min, self.route_view.cum_distance_max),
+            'cumDistance_km': ((float, int), self.route_view.cum_distance_min / 1000, self.route_view.cum_distance_max / 1000)
+        }
 
-            # Upload camping data
-            script_directory = os.path.dirname(os.path.abspath(__file__))
-            csv_file_path = os.path.join(script_directory, constants.CAMPING)
-            self.camping_df = pd.read_csv(csv_file_path)
+    def _build_stop_indices(self) -> None:
+        """ Build the sorted indices of the control stops and campsites. None if they are not annotated with cumDistance. """
+        self.control_stops_index = StopIndex(self.control_stops_df) if 'cumDistance' in self.control_stops_df.columns else None
+        self.camping_index = StopIndex(self.camping_df) if 'cumDistance' in self.camping_df.columns else None
+
+    def _check_control_stops_index(self) -> None:
+        """ Raise a ValueError if the control stops are not annotated with cumDistance. """
+        if self.control_stops_index is None:
+            raise ValueError('The control stops have no cumDistance column. Annotate them first with insert_to_control_stops, '
+                             'which runs annotate_stops and saves the result.')
+
+    @staticmethod
+    def _ask_csv_file(title:str) -> str:
+        """ Open a file dialog to choose a csv file. Return None if no file is chosen.
+
+            Inputs:
+                title (str): The title of the file dialog. """
+        root = tk.Tk()
+        root.withdraw()  # Hide the main window
+        root.lift()  # Bring the window to the front
+        root.attributes('-topmost', True)  # Keep the window on top of all others
+
+        chosen_file = filedialog.askopenfilename(title=title, filetypes=[("CSV files", "*.csv")])
+
+        if chosen_file:
+            print(f"Data read from {chosen_file}.")
+            return chosen_file
+
+        print("No directory chosen. Data not read.")
+        return None
+
+    @property
+    def content_hash(self) -> str:
+        """ Return the content hash of the csv files the route was loaded from. """
+        return self.route_cache.content_hash
 
-        # Create k-d tree for searching
-        self.kdtree_route = KDTree(self.route_df[['latitude', 'longitude']].values)
-        # self.kdtree_cs = KDTree(self.control_stops_df[['latitude', 'longitude']].values)
+    @property
+    def route_df(self) -> pd.DataFrame:
+        """ Return the route data as a Pandas DataFrame, built on the first access. """
+        return self.route_view.to_dataframe()
 
     @property
     def get_route_data(self) -> pd.DataFrame:
@@ -100,16 +137,9 @@ class Route():
             Inputs:
                 variables (dict): The variables to be checked. """
 
-        validation_rules = {
-            'latitude': (float, constants.GEO['latitude']['min'], constants.GEO['latitude']['max']),
-            'longitude': (float, constants.GEO['longitude']['min'], constants.GEO['longitude']['max']),
-            'cumDistance': ((float, int), self.route_df['cumDistance'].min(), self.route_df['cumDistance'].max()),
-            'cumDistance_km': ((float, int), self.route_df['cumDistance'].min() / 1000, self.route_df['cumDistance'].max() / 1000)
-        }
-
         for variable, value in variables.items():
-            if variable in validation_rules:
-                value_type, min_value, max_value = validation_rules[variable]
+            if variable in self.validation_rules:
+                value_type, min_value, max_value = self.validation_rules[variable]
 
                 if value is not None:
                     if not isinstance(value, value_type):
@@ -122,15 +152,19 @@ class Route():
                 raise ValueError(f'Wrong variable. Received: {variable}')
             
     
-    def find_closest_row_cumDistance(self, cum_distance:float, print_is_requested:bool=False) -> Tuple[pd.Series, bool]:
-        """ """
+    def find_closest_row_cumDistance(self, cum_distance:float, print_is_requested:bool=False) -> Tuple[RouteRecord, int]:
+        """ Find the first row in the route at or after the given cumulative distance.
+
+            Inputs:
+                cum_distance (float): The cumulative distance in meters.
+                print_is_requested (bool): Whether to print the nearest point index. """
         # Check that cumDistance is between the range
-        if not (self.route_df['cumDistance'].min() <= cum_distance <= self.route_df['cumDistance'].max()):
-            raise ValueError(f'Cumulative distance has to be between {self.route_df["cumDistance"].min()} and {self.route_df["cumDistance"].max()}. Received: {cum_distance}')
+        if not (self.route_view.cum_distance_min <= cum_distance <= self.route_view.cum_distance_max):
+            raise ValueError(f'Cumulative distance has to be between {self.route_view.cum_distance_min} and {self.route_view.cum_distance_max}. Received: {cum_distance}')
         
-        nearest_point_index = self.route_df['cumDistance'].searchsorted(cum_distance, side='left')
+        nearest_point_index = int(np.searchsorted(self.route_view.cum_distance, cum_distance, side='left'))
         
-        closest_row = self.route_df.iloc[nearest_point_index]
+        closest_row = self.route_view.record(nearest_point_index)
 
         if print_is_requested:
             print('Nearest index in csv file:', nearest_point_index + 2)
@@ -138,20 +172,111 @@ class Route():
 
         return closest_row, nearest_point_index
     
-    def find_closest_row(self, position:dict, print_is_requested:bool=False) -> Tuple[pd.Series, int]:
+    def state_at(self, cum_distances:np.ndarray) -> dict:
+        """ Return the route state at arbitrary cumulative distances: interpolated position, altitude, heading (theta)
+            and inclination, and the maxSpeed held from the previous vertex.
+
+            Inputs:
+                cum_distances (np.ndarray): The cumulative distances in meters.
+
+            Returns:
+                state (dict): Arrays with the cumDistance key and the STATE_COLUMNS and STATE_STEP_COLUMNS present in the route. """
+
+        cum_distances = np.atleast_1d(np.asarray(cum_distances, dtype=np.float64))
+
+        out_of_range = ~((self.route_view.cum_distance_min <= cum_distances) & (cum_distances <= self.route_view.cum_distance_max))
+        if out_of_range.any():
+            raise ValueError(f'Cumulative distance has to be between {self.route_view.cum_distance_min} and {self.route_view.cum_distance_max}. Received: {cum_distances[out_of_range]}')
+
+        columns = [column for column in self.STATE_COLUMNS if column in self.route_view]
+
+        state = {'cumDistance': cum_distances}
+        state.update(self.route_view.interpolate(
+            cum_distances,
+            columns=columns,
+            step_columns=[column for column in self.STATE_STEP_COLUMNS if column in self.route_view],
+            angle_columns=[column for column in self.STATE_ANGLE_COLUMNS if column in columns]
+        ))
+
+        return state
+
+    def range_query(self, start_cum_distances:np.ndarray, end_cum_distances:np.ndarray) -> dict:
+        """ Return distance, time at max speed limit, climb, descent and mean inclination between
+            start and end cumulative distances. Scalars or arrays of ranges are accepted.
+
+            Inputs:
+                start_cum_distances (np.ndarray): The start cumulative distances in meters.
+                end_cum_distances (np.ndarray): The end cumulative distances in meters. """
+
+        for cum_distances in [start_cum_distances, end_cum_distances]:
+            cum_distances = np.atleast_1d(cum_distances)
+            out_of_range = ~((self.route_view.cum_distance_min <= cum_distances) & (cum_distances <= self.route_view.cum_distance_max))
+            if out_of_range.any():
+                raise ValueError(f'Cumulative distance has to be between {self.route_view.cum_distance_min} and {self.route_view.cum_distance_max}. Received: {cum_distances[out_of_range]}')
+
+        return self.route_ranges.query(start_cum_distances, end_cum_distances)
+
+    def get_simplified_indices(self, tolerance:float) -> np.ndarray:
+        """ Return the indices of the route vertices of the coarsest simplified geometry whose tolerance
+            does not exceed the requested one. All the vertices are returned if no level is accurate enough.
+
+            Inputs:
+                tolerance (float): The maximum acceptable distance from the full route in meters. """
+
+        accurate_levels = [level for level in self.simplified_indices if level <= tolerance]
+
+        if not accurate_levels:
+            return np.arange(self.route_view.length)
+
+        return self.simplified_indices[max(accurate_levels)]
+
+    def get_simplified_route(self, tolerance:float, columns:list=['latitude', 'longitude']) -> pd.DataFrame:
+        """ Return the simplified route for the given tolerance, with the routeIndex column mapping back to the full route.
+
+            Inputs:
+                tolerance (float): The maximum acceptable distance from the full route in meters.
+                columns (list): The route columns to be returned (default: ['latitude', 'longitude']). """
+
+        indices = self.get_simplified_indices(tolerance)
+
+        simplified_df = pd.DataFrame({column: self.route_view.column(column)[indices] for column in columns})
+        simplified_df['routeIndex'] = indices
+
+        return simplified_df
+
+    def snap_position(self, position:dict) -> Tuple[int, float]:
+        """ Return the index of the closest route vertex and the distance to the route in meters.
+
+            Inputs:
+                position (dict): The position with latitude and longitude keys. """
+
+        self._check_variables(position)
+
+        return self.route_index.query(position['latitude'], position['longitude'])
+
+    def is_off_route(self, position:dict, max_distance:float=None) -> bool:
+        """ Return True if the position is further than max_distance meters from the route.
+
+            Inputs:
+                position (dict): The position with latitude and longitude keys.
+                max_distance (float): The maximum distance to the route in meters (default: OFF_ROUTE_DISTANCE). """
+
+        if max_distance is None:
+            max_distance = self.OFF_ROUTE_DISTANCE
+
+        _, distance = self.snap_position(position)
+        return distance > max_distance
+
+    def find_closest_row(self, position:dict, print_is_requested:bool=False) -> Tuple[RouteRecord, int]:
         """ Find the closest row in the route to the given position.
 
             Inputs:
                 position (dict): The position with latitude and longitude keys.
                 print_is_requested (bool): Whether to print the nearest point index. """
         
-        self._check_variables(position)
-
-        actual_coords = (position['latitude'], position['longitude'])
-
-        # Query the k-d tree to find the nearest point index
-        nearest_point_index = self.kdtree_route.query([actual_coords], k=1)[1][0]
-        closest_row = self.route_df.iloc[nearest_point_index]
+        # Query the spatial index to find the nearest point index
+        nearest_point_index, _ = self.snap_position(position)
+        closest_row = self.route_view.record(nearest_point_index)
 
         if print_is_requested:
             print('Nearest index in csv file:', nearest_point_index + 2)
@@ -159,79 +284,204 @@ class Route():
 
         return closest_row, nearest_point_index
     
+    def _check_coordinates(self, coordinates:np.ndarray) -> np.ndarray:
+        """ Check that the coordinates have shape (n, 2) and are between the ranges. 
+        
+            Inputs:
+                coordinates (np.ndarray): The coordinates as latitude and longitude columns. """
+
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+
+        if coordinates.ndim != 2 or coordinates.shape[1] != 2:
+            raise ValueError(f'coordinates have to be of shape (n, 2). Received: {coordinates.shape}')
+
+        for column, variable in enumerate(['latitude', 'longitude']):
+            min_value = constants.GEO[variable]['min']
+            max_value = constants.GEO[variable]['max']
+            out_of_range = ~((min_value <= coordinates[:, column]) & (coordinates[:, column] <= max_value))
+
+            if out_of_range.any():
+                raise ValueError(f'{variable} has to be between {min_value} and {max_value}. Received: {coordinates[out_of_range, column]}')
+
+        return coordinates
+
+    def snap_positions(self, coordinates:np.ndarray) -> dict:
+        """ Snap multiple positions to the route with a single query of the spatial index.
+
+            Inputs:
+                coordinates (np.ndarray): The positions with shape (n, 2) as latitude and longitude.
+
+            Returns:
+                snapped (dict): Arrays of length n with keys index, cumDistance, cumTimeAtMaxSpeedLim and distanceToRoute (in meters). """
+
+        coordinates = self._check_coordinates(coordinates)
+
+        indices, distances = self.route_index.query_many(coordinates)
+
+        return {
+            'index': indices,
+            'cumDistance': self.route_view.cum_distance[indices],
+            'cumTimeAtMaxSpeedLim': self.route_view.column('cumTimeAtMaxSpeedLim')[indices],
+            'distanceToRoute': distances
+        }
+
+    def project_positions(self, coordinates:np.ndarray) -> dict:
+        """ Project one or more positions onto the route segments and interpolate the route between the two vertices.
+
+            Inputs:
+                coordinates (np.ndarray): The positions with shape (2,) or (n, 2) as latitude and longitude.
+
+            Returns:
+                projected (dict): Arrays with keys segmentIndex, fraction, cumDistance, cumTimeAtMaxSpeedLim, altitude and distanceToRoute (in meters). """
+
+        coordinates = self._check_coordinates(np.atleast_2d(coordinates))
+
+        segments, fractions, distances = self.route_index.project_many(coordinates)
+        next_vertices = np.minimum(segments + 1, self.route_view.length - 1)
+
+        projected = {
+            'segmentIndex': segments,
+            'fraction': fractions
+        }
+        for column in ['cumDistance', 'cumTimeAtMaxSpeedLim', 'altitude']:
+            values = self.route_view.column(column)
+            projected[column] = values[segments] + fractions * (values[next_vertices] - values[segments])
+
+        projected['distanceToRoute'] = distances
+
+        return projected
+
+    def project_position(self, position:dict) -> dict:
+        """ Project a position onto the route segments. See project_positions for the returned keys.
+
+            Inputs:
+                position (dict): The position with latitude and longitude keys. """
+
+        self._check_variables(position)
+
+        projected = self.project_positions(np.array([position['latitude'], position['longitude']]))
+
+        return {key: value[0].item() for key, value in projected.items()}
+
     def find_closest_rows(self, position_df:pd.DataFrame, print_is_requested:bool=False) -> pd.DataFrame:
         """ Find the closest rows in the route to the given positions.
 
             Inputs:
                 positions (pd.DataFrame): The positions with latitude and longitude columns.
-                print_is_requested (bool): Whether to print the nearest point index. """
+                print_is_requested (bool): Whether to print the nearest point index. 
+
+            Returns:
+                closest_rows_df (pd.DataFrame): The closest route rows with the index and distanceToRoute columns. """
         
-        closest_rows_and_indices = position_df.apply(lambda row: self.find_closest_row({'latitude': row['latitude'], 'longitude': row['longitude']}, print_is_requested), axis=1)
-        closest_rows_df = pd.DataFrame(closest_rows_and_indices.tolist(), columns=['closest_row', 'index'])
+        snapped = self.snap_positions(position_df[['latitude', 'longitude']].values)
+
+        closest_rows_df = pd.DataFrame({column: values[snapped['index']] for column, values in self.route_view.columns.items()})
+        closest_rows_df['index'] = snapped['index']
+        closest_rows_df['distanceToRoute'] = snapped['distanceToRoute']
+
+        if print_is_requested:
+            print('Nearest indices in csv file:', snapped['index'] + 2)
+            print('Nearest indices in dataframe:', snapped['index'])
+
         return closest_rows_df
     
-    def insert_to_control_stops(self, choose_specific:bool=False) -> None:
-        """ Insert the cumDistance column to the control stops data. """
+    def annotate_stops(self, stops_df:pd.DataFrame, add_time:bool=True) -> pd.DataFrame:
+        """ Return a copy of the stops with cumDistance, cumTimeAtMaxSpeedLim, dfIndex and csvIndex columns,
+            computed with a single snapping query. No dialog is opened and nothing is saved.
 
-        closest_rows_df = self.find_closest_rows(self.control_stops_df[['latitude', 'longitude']])
+            Inputs:
+                stops_df (pd.DataFrame): The stops with latitude and longitude columns.
+                add_time (bool): Whether to add the cumTimeAtMaxSpeedLim column (default: True). """
 
-        self.control_stops_df['cumDistance'] = closest_rows_df['closest_row'].apply(lambda x: x['cumDistance']).values
-        self.control_stops_df['cumTimeAtMaxSpeedLim'] = closest_rows_df['closest_row'].apply(lambda x: x['cumTimeAtMaxSpeedLim']).values
-        self.control_stops_df['dfIndex'] = closest_rows_df['index'].values
-        self.control_stops_df['csvIndex'] = closest_rows_df['index'].values + 2
-            
+        snapped = self.snap_positions(stops_df[['latitude', 'longitude']].values)
+
+        annotated_df = stops_df.copy()
+        annotated_df['cumDistance'] = snapped['cumDistance']
+        if add_time:
+            annotated_df['cumTimeAtMaxSpeedLim'] = snapped['cumTimeAtMaxSpeedLim']
+        annotated_df['dfIndex'] = snapped['index']
+        annotated_df['csvIndex'] = snapped['index'] + 2
+
+        return annotated_df
+
+    def _save_stops(self, stops_df:pd.DataFrame, name:str, default_file:str, choose_specific:bool, save_file:str) -> None:
+        """ Save the stops to a csv file chosen with a dialog, to save_file, or to the default file from constants.py. """
         if choose_specific:
-            # Save the control stops data to a specific file
             root = tk.Tk()
             root.withdraw()
             root.lift()
             root.attributes('-topmost', True)
 
-            chosen_file = filedialog.asksaveasfilename(title='Save the control stops data to a csv file', filetypes=[("CSV files", "*.csv")])
+            chosen_file = filedialog.asksaveasfilename(title=f'Save the {name} data to a csv file', filetypes=[("CSV files", "*.csv")])
 
             if chosen_file:
-                self.control_stops_df.to_csv(chosen_file, index=False)
-                print(f"Control stops data saved to {chosen_file}.")
+                stops_df.to_csv(chosen_file, index=False)
+                print(f"{name.capitalize()} data saved to {chosen_file}.")
 
         else:
-            script_directory = os.path.dirname(os.path.abspath(__file__))
-            csv_file_path = os.path.join(script_directory, constants.CONTROL_STOPS)
-            self.control_stops_df.to_csv(csv_file_path, index=False)
+            if save_file is None:
+                script_directory = os.path.dirname(os.path.abspath(__file__))
+                save_file = os.path.join(script_directory, default_file)
+
+            stops_df.to_csv(save_file, index=False)
         
-            print(f"Control stops data saved to {csv_file_path}.")
+            print(f"{name.capitalize()} data saved to {save_file}.")
+
+    def insert_to_control_stops(self, choose_specific:bool=False, save_file:str=None) -> None:
+        """ Insert the cumDistance column to the control stops data and save it.
+
+            Inputs:
+                choose_specific (bool): Whether to choose the file with a dialog (default: False).
+                save_file (str): The file to save to without a dialog (default: the file the control stops were loaded from). """
+
+        self.control_stops_df = self.annotate_stops(self.control_stops_df)
+        self._build_stop_indices()
 
-    def find_next_cs_cumDistance(self, current_cum_distance:float, print_is_requested:bool=False) -> Tuple[pd.Series, bool]:
-        """ """
+        self._save_stops(self.control_stops_df, 'control stops', self.control_stops_file or constants.CONTROL_STOPS, choose_specific, save_file)
+
+    def find_next_cs_cumDistance(self, current_cum_distance:float, print_is_requested:bool=False) -> Tuple[RouteRecord, int]:
+        """ Find the first control stop at or after the given cumulative distance.
+
+            Inputs:
+                current_cum_distance (float): The cumulative distance in meters.
+                print_is_requested (bool): Whether to print the control stop index. """
         # Check that cumDistance is between the range
-        if not (self.route_df['cumDistance'].min() <= current_cum_distance <= self.route_df['cumDistance'].max()):
-            raise ValueError(f'Cumulative distance has to be between {self.route_df["cumDistance"].min()} and {self.route_df["cumDistance"].max()}. Received: {current_cum_distance}')
+        if not (self.route_view.cum_distance_min <= current_cum_distance <= self.route_view.cum_distance_max):
+            raise ValueError(f'Cumulative distance has to be between {self.route_view.cum_distance_min} and {self.route_view.cum_distance_max}. Received: {current_cum_distance}')
+        self._check_control_stops_index()
         
-        nearest_point_index = self.control_stops_df['cumDistance'].searchsorted(current_cum_distance, side='left')
+        next_index = int(self.control_stops_index.next(current_cum_distance, inclusive=True)[0])
+
+        if next_index == StopIndex.NO_STOP:
+            print("There's no next control stop. The current position is after the last one on the route.")
+            return None, None
         
-        closest_row = self.control_stops_df.iloc[nearest_point_index]
+        next_row = self.control_stops_index.record(next_index)
 
         if print_is_requested:
-            print('Nearest index in csv file:', nearest_point_index + 2)
-            print('Nearest index in dataframe:', nearest_point_index)
+            print('Nearest index in csv file:', next_index + 2)
+            print('Nearest index in dataframe:', next_index)
 
-        return closest_row, nearest_point_index
+        return next_row, next_index
     
-    def find_next_cs(self, position:dict, print_is_requested:bool=False) -> Tuple[pd.Series, int]:
-        """ """
-        
-        self._check_variables(position)
+    def find_next_cs(self, position:dict, print_is_requested:bool=False) -> Tuple[RouteRecord, int]:
+        """ Find the next control stop after the given position.
 
+            Inputs:
+                position (dict): The position with latitude and longitude keys.
+                print_is_requested (bool): Whether to print the control stop index. """
+        self._check_control_stops_index()
+        
         row, _ = self.find_closest_row(position, print_is_requested=print_is_requested)
 
         # Find the first cumDistance > row['cumDistance'] in control stop not the closest one
-        next_rows = self.control_stops_df[self.control_stops_df['cumDistance'] > row['cumDistance']]
+        next_index = int(self.control_stops_index.next(row['cumDistance'])[0])
         
-        if next_rows.empty:
+        if next_index == StopIndex.NO_STOP:
             print("There's no next control stop. The closest control stop might be the last one on the route.")
             return None, None
         
-        next_index = next_rows.index[0]
-        next_row = self.control_stops_df.iloc[next_index]
+        next_row = self.control_stops_index.record(next_index)
 
         if print_is_requested:
             print('Nearest index in csv file:', next_index + 2)
@@ -239,31 +489,14 @@ class Route():
 
         return next_row, next_index
     
-    def insert_to_camping(self, choose_specific:bool=False) -> None:
-        """ Insert the cumDistance column to the control stops data. """
-
-        closest_rows_df = self.find_closest_rows(self.camping_df[['latitude', 'longitude']])
+    def insert_to_camping(self, choose_specific:bool=False, save_file:str=None) -> None:
+        """ Insert the cumDistance column to the camping data and save it.
 
-        self.camping_df['cumDistance'] = closest_rows_df['closest_row'].apply(lambda x: x['cumDistance']).values
-        self.camping_df['dfIndex'] = closest_rows_df['index'].values
-        self.camping_df['csvIndex'] = closest_rows_df['index'].values + 2
-            
-        if choose_specific:
-            # Save the camping data to a specific file
-            root = tk.Tk()
-            root.withdraw()
-            root.lift()
-            root.attributes('-topmost', True)
+            Inputs:
+                choose_specific (bool): Whether to choose the file with a dialog (default: False).
+                save_file (str): The file to save to without a dialog (default: the file the camping data were loaded from). """
 
-            chosen_file = filedialog.asksaveasfilename(title='Save the camping data to a csv file', filetypes=[("CSV files", "*.csv")])
+        self.camping_df = self.annotate_stops(self.camping_df, add_time=False)
+        self._build_stop_indices()
 
-            if chosen_file:
-                self.camping_df.to_csv(chosen_file, index=False)
-                print(f"Camping data saved to {chosen_file}.")
-
-        else:
-            script_directory = os.path.dirname(os.path.abspath(__file__))
-            csv_file_path = os.path.join(script_directory, constants.CAMPING)
-            self.camping_df.to_csv(csv_file_path, index=False)
-        
-            print(f"Camping data saved to {csv_file_path}.")
\ No newline at end of file
+        self._save_stops(self.camping_df, 'camping', self.camping_file or constants.CAMPING, choose_specific, save_file)
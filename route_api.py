@@ -3,7 +3,9 @@
 import pandas as pd
 import numpy as np
 import constants
+from collections import OrderedDict
 from route import Route
+from site_placement import importance_density, place_sites, driving_times, DrivingDay, arrival_sites
 
 class RouteAPI():
     """ Class for interacting with the route data obtained from Brouter and cut them for the api requests.
@@ -11,16 +13,44 @@ class RouteAPI():
     Attributes:
         route (Route): The route class. """
     
-    def __init__(self, route:Route) -> None:
-        self.route = route
-        self.route_data = self.route.get_route_data
+    DROPPED_COLUMNS: list = ['inclination', 'inclinationSmooth', 'altitude', 'distance'] # not needed for the api requests
+    STEP_COLUMNS: list = ['maxSpeed'] # held from the previous row instead of interpolated
+    MODES: list = ['uniform', 'adaptive', 'arrival'] # site placement modes
+    CUT_CACHE_SIZE: int = 64 # number of cuts kept in the least recently used cache
+    TIME_SPACING: float = 30.0 # in minutes, default driving time between sites in arrival mode
+    FORECAST_HORIZON: float = 48.0 # in hours, default forecast horizon in arrival mode
+    COPY_ON_WRITE: bool = int(pd.__version__.split('.')[0]) >= 3 # always enabled from pandas 3
 
-        self.api_route = pd.DataFrame()
+    def __init__(self, route:Route) -> None:
+        self.set_route(route)
 
     @property
     def get_api_route_data(self) -> pd.DataFrame:
         """ Return the route data as a Pandas DataFrame. """
         return self.api_route
+
+    @property
+    def get_cut_cache_info(self) -> dict:
+        """ Return the hits, misses and size of the cut cache. """
+        return {'hits': self.cut_cache_hits, 'misses': self.cut_cache_misses, 'size': len(self.cut_cache), 'max_size': self.CUT_CACHE_SIZE}
+
+    def set_route(self, route:Route) -> None:
+        """ Switch to another route, e.g. a detour from the route registry.
+
+            Inputs:
+                route (Route): The new route. """
+        self.route = route
+        self.api_route = pd.DataFrame()
+
+        # Least recently used cache of the cuts, emptied when the route changes
+        self.cut_cache: OrderedDict = OrderedDict()
+        self.cut_cache_hits: int = 0
+        self.cut_cache_misses: int = 0
+
+        # Columns of the cut route, in the order of the route table
+        self.cut_columns = [column for column in self.route.route_view.columns if column not in self.DROPPED_COLUMNS]
+        self.step_columns = [column for column in self.cut_columns if column in self.STEP_COLUMNS]
+        self.interpolated_columns = [column for column in self.cut_columns if column not in self.STEP_COLUMNS]
     
     def _check_variables(self, variables:dict) -> None:
         """ Check if the variables are of the correct type and between the ranges. 
@@ -32,7 +62,7 @@ class RouteAPI():
             'latitude': (float, -90.0, 90.0),
             'longitude': (float, -180.0, 180.0),
             'number_sites': (int, 2, constants.MAX_SITES_NUMBER_SOLCAST),
-            'delta_spacing': (float, 1, self.route_data['cumDistance'].max()) # in meters
+            'delta_spacing': (float, 1, self.route.route_view.cum_distance_max) # in meters
         }
 
         for variable, value in variables.items():
@@ -49,55 +79,69 @@ class RouteAPI():
             else:
                 raise ValueError(f'Wrong variable. Received: {variable}')
 
-    def cut_route_data(self, current_position:dict=None, final_position:dict=None, number_sites:int=None, delta_spacing:float=None, print_is_requested:bool=False) -> pd.DataFrame:
+    def _cut_rows(self, start_index:int, end_index:int, start_distance:float) -> pd.DataFrame:
+        """ Return the cut columns of the rows between the start and end index (included) with the cumDistanceCut column.
+
+            Inputs:
+                start_index (int): The index of the first row.
+                end_index (int): The index of the last row.
+                start_distance (float): The cumulative distance subtracted for the cumDistanceCut column in meters. """
+        view = self.route.route_view
+        rows = slice(start_index, end_index + 1)
+
+        cut_data = {column: view.column(column)[rows] for column in self.cut_columns}
+        cut_data['cumDistanceCut'] = view.cum_distance[rows] - start_distance
+
+        return pd.DataFrame(cut_data)
+
+    def cut_route_data(self, current_position:dict=None, final_position:dict=None, number_sites:int=None, delta_spacing:float=None, mode:str='uniform',
+                       forecast_gradients:pd.DataFrame=None, time_spacing:float=None, start_time:pd.Timestamp=None, speed=None,
+                       horizon:float=None, print_is_requested:bool=False) -> pd.DataFrame:
         """ Cut the route data given the current position, final position, number of sites, and delta spacing.
+            The route is never copied: the sites are interpolated in one pass on the cached columns of the route view.
+            Cuts are cached by snapped route vertices and parameters; the returned dataframe is a copy-on-write view of the cached one.
         
             Inputs:
                 current_position (dict): The current position with latitude and longitude keys.
                 final_position (dict): The final position with latitude and longitude keys.
                 number_sites (int): The number of sites to be generated.
                 delta_spacing (float): The spacing between sites in meters.
+                mode (str): The site placement, 'uniform' for equally-spaced sites or 'adaptive' to place the number_sites
+                    where heading, altitude, driving time or the forecast change fastest (default: 'uniform').
+                forecast_gradients (pd.DataFrame): Spatial gradients of a previous forecast with cumDistance and gradient columns,
+                    see site_placement.forecast_gradients. Only used in adaptive mode (default: None).
+                time_spacing (float): The driving time between sites in minutes in arrival mode (default: TIME_SPACING).
+                    In arrival mode the sites are laid out by expected arrival time, denser around the overnight stops
+                    and not beyond the forecast horizon, and the arrivalTime column is added. number_sites caps the sites.
+                start_time (pd.Timestamp): The time at the current position in arrival mode (default: now).
+                speed (float or np.ndarray): The speed in km/h, constant or for each route row, in arrival mode
+                    (default: None, cumTimeAtMaxSpeedLim is used).
+                horizon (float): The forecast horizon in hours in arrival mode (default: FORECAST_HORIZON).
                 print_is_requested (bool): Whether to print the cut data. """
-        
-        cut_data = self.route_data.copy()
 
-        # Delete columns that are not needed
-        cut_data = cut_data.drop('inclination', axis=1)
-        cut_data = cut_data.drop('inclinationSmooth', axis=1)
-        cut_data = cut_data.drop('altitude', axis=1)
-        cut_data = cut_data.drop('distance', axis=1)
+        if mode not in self.MODES:
+            raise ValueError(f'mode has to be one of {self.MODES}. Received: {mode}')
 
-        # Add cumulative distance column
-        cut_data = pd.concat([cut_data, pd.DataFrame({'cumDistanceCut': cut_data['cumDistance']})], axis=1)
+        cum_distance = self.route.route_view.cum_distance
 
-        # If all inputs are None
-        if current_position is None and final_position is None and number_sites is None and delta_spacing is None:
-            return cut_data
-        
         # Initialize start and end index
         start_index = 0
-        # end_index = len(cut_data)
-        
+        end_index = len(cum_distance) - 1
+        start_distance = 0.0
+
         # If current position is given
         if current_position is not None:
-            closest_point = self.route.find_closest_row(position=current_position, print_is_requested=print_is_requested)
-            start_index = closest_point[1]
+            start_index = self.route.find_closest_row(position=current_position, print_is_requested=print_is_requested)[1]
 
             # Subtract cumulative distance
-            start_distance = cut_data.iloc[start_index]['cumDistance']
-            cut_data['cumDistanceCut'] -= start_distance
-
-            # Cut data and reset indexing
-            cut_data = cut_data.iloc[start_index:].copy()
-            cut_data = cut_data.reset_index(drop=True)
+            start_distance = float(cum_distance[start_index])
 
         # If final position is given
         if final_position is not None:
             if delta_spacing is not None:
                 raise ValueError('The final position cannot be given with delta_spacing')
             
-            closest_point = self.route.find_closest_row(position=final_position, print_is_requested=print_is_requested)
-            end_index = closest_point[1]
+            end_index = self.route.find_closest_row(position=final_position, print_is_requested=print_is_requested)[1]
 
             if end_index < start_index:
                 raise ValueError('The final position cannot be before the start position')
@@ -105,44 +149,112 @@ class RouteAPI():
             if end_index == start_index:
                 raise ValueError('The final and start position cannot be equal')
 
-            # Cut data
-            cut_index = end_index - start_index + 1 # -start_index+1 to include previous cut and final position
-            cut_data = cut_data.iloc[:cut_index].copy()
+        # Repeated cuts from the same route vertices are served from the cache
+        key = self._cut_key(start_index, end_index, number_sites, delta_spacing, mode, forecast_gradients, time_spacing, start_time, speed, horizon)
 
-        # Variable to add last point for interpolation
-        add_last_point_is_true: bool = True
+        if key is not None and key in self.cut_cache:
+            self.cut_cache_hits += 1
+            self.cut_cache.move_to_end(key)
+            cut_data = self.cut_cache[key]
+        else:
+            cut_data = self._cut(start_index, end_index, start_distance, number_sites, delta_spacing, mode, forecast_gradients,
+                                 time_spacing, start_time, speed, horizon)
+
+            if key is not None:
+                self.cut_cache_misses += 1
+                self.cut_cache[key] = cut_data
+                if len(self.cut_cache) > self.CUT_CACHE_SIZE:
+                    self.cut_cache.popitem(last=False)
+
+        if print_is_requested:
+            print(cut_data)
+
+        # With copy-on-write a shallow copy is enough to protect the cached cut, older pandas needs a deep copy
+        return cut_data.copy(deep=not self.COPY_ON_WRITE)
+
+    def _cut_key(self, start_index:int, end_index:int, number_sites:int, delta_spacing:float, mode:str, forecast_gradients:pd.DataFrame,
+                 time_spacing:float, start_time:pd.Timestamp, speed, horizon:float) -> tuple:
+        """ Return the cache key of a cut, None if the cut cannot be cached (it depends on the current time or on arrays). """
+        if forecast_gradients is not None or (mode == 'arrival' and start_time is None) or np.ndim(speed) > 0:
+            return None
+
+        return (self.route.content_hash, start_index, end_index, number_sites, delta_spacing, tuple(self.cut_columns),
+                mode, time_spacing, start_time, speed, horizon)
 
+    def _cut(self, start_index:int, end_index:int, start_distance:float, number_sites:int, delta_spacing:float, mode:str,
+             forecast_gradients:pd.DataFrame, time_spacing:float, start_time:pd.Timestamp, speed, horizon:float) -> pd.DataFrame:
+        """ Cut the route data between the start and end index, see cut_route_data. """
+
+        cum_distance = self.route.route_view.cum_distance
 
         # None of the variables are given
-        if number_sites is None and delta_spacing is None:
-            return cut_data
+        if number_sites is None and delta_spacing is None and mode == 'uniform':
+            return self._cut_rows(start_index, end_index, start_distance)
+
+        if mode == 'adaptive':
+            if number_sites is None or delta_spacing is not None:
+                raise ValueError('The adaptive mode needs number_sites as site budget and no delta_spacing')
+            self._check_variables({'number_sites': number_sites})
+
+            density = importance_density(self.route.route_view, start_index, end_index, forecast_gradients=forecast_gradients)
+            x_route = place_sites(cum_distance[start_index:end_index + 1], density, number_sites)
+
+            return self._interpolate_sites(x_route - start_distance, x_route)
+
+        if mode == 'arrival':
+            if delta_spacing is not None:
+                raise ValueError('The arrival mode cannot be given with delta_spacing. Use time_spacing instead')
+            if number_sites is not None:
+                self._check_variables({'number_sites': number_sites})
+
+            time_spacing = self.TIME_SPACING if time_spacing is None else time_spacing
+            horizon = self.FORECAST_HORIZON if horizon is None else horizon
+            if time_spacing <= 0 or horizon <= 0:
+                raise ValueError(f'time_spacing and horizon have to be positive. Received: {time_spacing} and {horizon}')
+
+            if start_time is None:
+                start_time = pd.Timestamp.now(tz=constants.TIMEZONE)
+            driving_day = DrivingDay(start_time)
+
+            route_times = driving_times(self.route.route_view, start_index, end_index, speed=speed)
+            site_times = arrival_sites(route_times, driving_day, time_spacing * 60, horizon_end=start_time + pd.Timedelta(hours=horizon))
+
+            # Keep the site budget, including the first and last sites
+            if number_sites is not None and len(site_times) > number_sites:
+                site_times = site_times[np.round(np.linspace(0, len(site_times) - 1, number_sites)).astype(int)]
+
+            x_route = np.interp(site_times, route_times, cum_distance[start_index:end_index + 1])
+
+            return self._interpolate_sites(x_route - start_distance, x_route, extra_columns={'arrivalTime': driving_day.arrival_times(site_times)})
+
+        end_distance = float(cum_distance[end_index]) - start_distance
+
+        # Variable to add last point for interpolation
+        add_last_point_is_true: bool = True
         
         # Both variables are given
-        elif number_sites is not None and delta_spacing is not None: # Case with final position already considered
+        if number_sites is not None and delta_spacing is not None: # Case with final position already considered
             total_distance = number_sites * delta_spacing
-            end_distance = cut_data.iloc[-1]['cumDistanceCut']
 
             if total_distance > end_distance:
                 raise ValueError('The total distance cannot be greater than the end distance of the route')
             
-            # Cut data
-            cut_data = cut_data.loc[cut_data['cumDistanceCut'] <= total_distance].copy()
+            # Cut data at the last row within the total distance
+            end_index = start_index + int(np.searchsorted(cum_distance[start_index:end_index + 1], start_distance + total_distance, side='right')) - 1
+            end_distance = float(cum_distance[end_index]) - start_distance
             add_last_point_is_true = False
         
         # Only number_sites is given
         elif number_sites is not None and delta_spacing is None:
             # Calculate delta spacing
-            delta_spacing = cut_data['cumDistanceCut'].max() / (number_sites - 1) # correction of first entry
+            delta_spacing = end_distance / (number_sites - 1) # correction of first entry
             add_last_point_is_true = False
 
         # Only delta_spacing is given
         elif number_sites is None and delta_spacing is not None:
             ################################################################# TODO ADD POINTS UNTIL THE END
-            end_distance = cut_data.iloc[-1]['cumDistanceCut']
-
             if delta_spacing > end_distance:
                 raise ValueError('One delta spacing cannot be greater than the end distance of the route')
-        
 
         # Save variables and check
         variables = {
@@ -152,39 +264,32 @@ class RouteAPI():
         self._check_variables(variables)
     
         # Find values to be interpolated
-        number_inter_point = int(cut_data['cumDistanceCut'].max() / delta_spacing)
+        number_inter_point = int(end_distance / delta_spacing)
         # Define the monotonically-increasing equally-spaced vector
         x = np.arange(number_inter_point + 1) * delta_spacing
+        x_route = x + start_distance
 
-        # Insert last point
+        # Insert last point, exactly on the last row of the cut
         if add_last_point_is_true:
-            x = np.append(x, cut_data['cumDistanceCut'].max())
+            x = np.append(x, end_distance)
+            x_route = np.append(x_route, cum_distance[end_index])
 
-        # Interpolation points
-        xp = cut_data['cumDistanceCut']
+        return self._interpolate_sites(x, x_route)
 
-        interpolated_data = pd.DataFrame()
-        for column in cut_data.columns:
-            if column == 'maxSpeed':
-                # Find previous index and corresponding value
-                indices = np.searchsorted(xp, x, side='right') - 1
-                pd_values = pd.DataFrame({column: cut_data[column].iloc[indices]})
-                pd_values = pd_values.reset_index(drop=True)
+    def _interpolate_sites(self, x:np.ndarray, x_route:np.ndarray, extra_columns:dict=None) -> pd.DataFrame:
+        """ Interpolate the cut columns at the sites, all at once, and hold maxSpeed from the previous row.
 
-                # Concatenate interpolated data
-                interpolated_data = pd.concat([interpolated_data, pd_values], axis=1)
+            Inputs:
+                x (np.ndarray): The cumulative distances of the sites from the start of the cut in meters.
+                x_route (np.ndarray): The cumulative distances of the sites on the route in meters.
+                extra_columns (dict): Additional columns of the sites appended to the output (default: None). """
 
-            elif column == 'cumDistanceCut':
-                # Convert to list and add to interpolated data
-                interpolated_data[column] = x.tolist()
+        interpolated = self.route.route_view.interpolate(x_route, columns=self.interpolated_columns, step_columns=self.step_columns)
+        interpolated['cumDistanceCut'] = x
 
-            else:
-                # Perform interpolation
-                fp = cut_data[column]
-                interpolated_values = np.interp(x, xp, fp)
-                interpolated_data[column] = interpolated_values.tolist()
-        
-        if print_is_requested:
-            print(interpolated_data)
+        interpolated_data = pd.DataFrame({column: interpolated[column] for column in self.cut_columns + ['cumDistanceCut']})
+
+        for column, values in (extra_columns or {}).items():
+            interpolated_data[column] = values
 
-        return interpolated_data
\ No newline at end of file
+        return interpolated_data
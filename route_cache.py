@@ -0,0 +1,249 @@
+# Created by aCentauri Solar Racing October 2026
+
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import constants
+import numpy as np
+import pandas as pd
+from route_index import RouteIndex
+from route_simplifier import simplification_levels
+
+class RouteCache():
+    """ Compiled, memory-mappable artifact of the route, control stops and camping csv files.
+        Each column is stored as a typed .npy file next to the pickled spatial index, the simplified
+        geometries of the route and a manifest with the content hash of the source files.
+        The artifact is rebuilt only when a source file changes.
+
+    Attributes:
+        source_files (dict): The csv files for the route, control_stops and camping tables (None if not given).
+        directory (str): The folder of the compiled artifact. """
+
+    VERSION: int = 3
+    MANIFEST: str = 'manifest.json'
+    INDEX_FILE: str = 'route_index.pkl'
+    TABLES: list = ['route', 'control_stops', 'camping']
+    SIMPLIFICATION_TOLERANCES: list = [5.0, 25.0, 100.0, 500.0] # in meters
+
+    def __init__(self, route_file:str, control_stops_file:str=None, camping_file:str=None, cache_directory:str=None) -> None:
+        if cache_directory is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
+            cache_directory = getattr(constants, 'ROUTE_CACHE_DIRECTORY', os.path.join(script_directory, '.route_cache'))
+
+        self.source_files = {
+            'route': os.path.abspath(route_file),
+            'control_stops': os.path.abspath(control_stops_file) if control_stops_file else None,
+            'camping': os.path.abspath(camping_file) if camping_file else None
+        }
+
+        # One artifact per route file, named after the file and its location
+        route_name = os.path.splitext(os.path.basename(route_file))[0]
+        location_hash = hashlib.sha1(self.source_files['route'].encode()).hexdigest()[:8]
+        self.directory = os.path.join(cache_directory, f"{route_name}_{location_hash}")
+
+        self.manifest: dict = {}
+
+    @staticmethod
+    def _file_stamp(file:str) -> dict:
+        """ Return the size and modification time of a file. """
+        stat = os.stat(file)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    @staticmethod
+    def _file_hash(file:str) -> str:
+        """ Return the content hash of a file. """
+        digest = hashlib.sha1()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @property
+    def content_hash(self) -> str:
+        """ Return the combined content hash of the source files of the compiled artifact. """
+        return self.manifest.get('content_hash', '')
+
+    def _read_manifest(self) -> dict:
+        """ Read the manifest of the compiled artifact. Return an empty dictionary if it does not exist. """
+        manifest_path = os.path.join(self.directory, self.MANIFEST)
+
+        if not os.path.isfile(manifest_path):
+            return {}
+
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self) -> None:
+        """ Write the manifest through a temporary file, so that a crash never leaves a partial manifest. """
+        manifest_path = os.path.join(self.directory, self.MANIFEST)
+
+        temporary_path = f'{manifest_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temporary_path, manifest_path)
+
+    def _is_valid(self, manifest:dict) -> bool:
+        """ Check that the compiled artifact was built from the current source files.
+            The content hash is only recomputed if the size or modification time of a file changed. If the content
+            is unchanged (e.g. after a touch, checkout or copy), the new stamp is written back to the manifest,
+            so the file is not hashed again on the next start. """
+
+        if manifest.get('version') != self.VERSION:
+            return False
+
+        stamps_changed = False
+
+        for table, file in self.source_files.items():
+            source = manifest['sources'].get(table)
+
+            if (file is None) != (source is None):
+                return False
+            if file is None:
+                continue
+            if source['path'] != file or not os.path.isfile(file):
+                return False
+
+            stamp = self._file_stamp(file)
+            if stamp != source['stamp']:
+                if self._file_hash(file) != source['hash']:
+                    return False
+                source['stamp'] = stamp
+                stamps_changed = True
+
+        if stamps_changed:
+            self.manifest = manifest
+            self._write_manifest()
+
+        return True
+
+    def _save_table(self, table:str, df:pd.DataFrame) -> list:
+        """ Save each column of the dataframe as a typed .npy file and return the column names.
+            The missing values of text columns are saved as a mask next to the column. """
+        table_directory = os.path.join(self.directory, table)
+        os.makedirs(table_directory)
+
+        for i, column in enumerate(df.columns):
+            values = df[column].to_numpy()
+            if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+                missing = pd.isna(values)
+                values = np.where(missing, '', values).astype(str)
+                if missing.any():
+                    np.save(os.path.join(table_directory, f"{i}_missing.npy"), missing, allow_pickle=False)
+            np.save(os.path.join(table_directory, f"{i}.npy"), values, allow_pickle=False)
+
+        return df.columns.tolist()
+
+    def save_array(self, name:str, values:np.ndarray) -> None:
+        """ Save an additional array derived from the route into the compiled artifact.
+
+            Inputs:
+                name (str): The name of the array.
+                values (np.ndarray): The array to be saved. """
+        np.save(os.path.join(self.directory, f"{name}.npy"), values, allow_pickle=False)
+
+    def load_array(self, name:str) -> np.ndarray:
+        """ Load an additional array from the compiled artifact as a memory map. Return None if it does not exist.
+
+            Inputs:
+                name (str): The name of the array. """
+        path = os.path.join(self.directory, f"{name}.npy")
+
+        if not os.path.isfile(path):
+            return None
+
+        return np.load(path, mmap_mode='r')
+
+    @staticmethod
+    def _simplified_name(tolerance:float) -> str:
+        """ Return the array name of the simplified route at the given tolerance. """
+        return f"simplified_{tolerance:g}m"
+
+    def _load_table(self, table:str) -> dict:
+        """ Load the memory-mapped columns of a table. Text columns with missing values are restored as object arrays with NaN. """
+        table_directory = os.path.join(self.directory, table)
+        columns = {}
+
+        for i, column in enumerate(self.manifest['columns'][table]):
+            values = np.load(os.path.join(table_directory, f"{i}.npy"), mmap_mode='r')
+
+            missing_path = os.path.join(table_directory, f"{i}_missing.npy")
+            if os.path.isfile(missing_path):
+                values = values.astype(object)
+                values[np.load(missing_path)] = np.nan
+
+            columns[column] = values
+
+        return columns
+
+    def compile(self) -> None:
+        """ Parse the source csv files and write the compiled artifact. """
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+
+        sources = {}
+        columns = {}
+        content_digest = hashlib.sha1()
+
+        for table, file in self.source_files.items():
+            if file is None:
+                sources[table] = None
+                columns[table] = []
+                continue
+
+            df = pd.read_csv(file)
+            columns[table] = self._save_table(table, df)
+
+            file_hash = self._file_hash(file)
+            content_digest.update(file_hash.encode())
+            sources[table] = {'path': file, 'stamp': self._file_stamp(file), 'hash': file_hash}
+
+            if table == 'route':
+                route_index = RouteIndex(df['latitude'].values, df['longitude'].values)
+                with open(os.path.join(self.directory, self.INDEX_FILE), 'wb') as f:
+                    pickle.dump(route_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+                # Simplified geometries as indices of the kept route vertices
+                for tolerance, indices in simplification_levels(route_index.points, self.SIMPLIFICATION_TOLERANCES).items():
+                    self.save_array(self._simplified_name(tolerance), indices)
+
+        self.manifest = {
+            'version': self.VERSION,
+            'content_hash': content_digest.hexdigest(),
+            'sources': sources,
+            'columns': columns,
+            'simplification_tolerances': self.SIMPLIFICATION_TOLERANCES
+        }
+
+        # The manifest is written last, so an interrupted compilation is never considered valid
+        self._write_manifest()
+
+    def load(self, print_is_requested:bool=False) -> dict:
+        """ Load the compiled artifact, compiling it first if a source file changed.
+
+            Inputs:
+                print_is_requested (bool): Whether to print if the artifact has been rebuilt.
+
+            Returns:
+                tables (dict): The memory-mapped columns of the route, control_stops and camping tables,
+                    the spatial index with the route_index key and the indices of the simplified route
+                    for each tolerance with the simplified key. """
+
+        self.manifest = self._read_manifest()
+
+        if not self._is_valid(self.manifest) or self.manifest.get('simplification_tolerances') != self.SIMPLIFICATION_TOLERANCES:
+            self.compile()
+
+            if print_is_requested:
+                print(f"Route cache rebuilt in {self.directory}.")
+
+        tables = {table: self._load_table(table) for table in self.TABLES}
+
+        with open(os.path.join(self.directory, self.INDEX_FILE), 'rb') as f:
+            tables['route_index'] = pickle.load(f)
+
+        tables['simplified'] = {tolerance: self.load_array(self._simplified_name(tolerance)) for tolerance in self.SIMPLIFICATION_TOLERANCES}
+
+        return tables
@@ -0,0 +1,118 @@
+# Created by aCentauri Solar Racing October 2026
+
+import hashlib
+import numpy as np
+from typing import Tuple
+from scipy.spatial import KDTree
+
+class RouteIndex():
+    """ Spatial index of the route built on Earth-Centered Earth-Fixed (ECEF) coordinates.
+        Distances returned by the index are straight-line distances in meters, which is
+        equivalent to the ground distance for the short ranges used to snap to the route.
+
+    Attributes:
+        key (str): The hash of the coordinates the index was built on.
+        points (np.ndarray): The ECEF coordinates of the route vertices with shape (n, 3).
+        kdtree (KDTree): The k-d tree built on the ECEF coordinates. """
+
+    # WGS84 ellipsoid
+    SEMI_MAJOR_AXIS: float = 6378137.0 # in meters
+    ECCENTRICITY_SQUARED: float = 6.69437999014e-3
+
+    def __init__(self, latitude:np.ndarray, longitude:np.ndarray) -> None:
+        self.key = self.coordinates_hash(latitude, longitude)
+        self.points = self.to_ecef(latitude, longitude)
+        self.kdtree = KDTree(self.points)
+
+    @staticmethod
+    def coordinates_hash(latitude:np.ndarray, longitude:np.ndarray) -> str:
+        """ Return a hash identifying the given coordinates. """
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(latitude, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(longitude, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def to_ecef(cls, latitude:np.ndarray, longitude:np.ndarray) -> np.ndarray:
+        """ Convert latitude and longitude in degrees (at zero height) to ECEF coordinates in meters.
+
+            Inputs:
+                latitude (np.ndarray): The latitude in degrees.
+                longitude (np.ndarray): The longitude in degrees. """
+
+        lat_rad = np.radians(np.asarray(latitude, dtype=np.float64))
+        lon_rad = np.radians(np.asarray(longitude, dtype=np.float64))
+
+        sin_lat = np.sin(lat_rad)
+        cos_lat = np.cos(lat_rad)
+
+        # Prime vertical radius of curvature
+        radius = cls.SEMI_MAJOR_AXIS / np.sqrt(1 - cls.ECCENTRICITY_SQUARED * sin_lat**2)
+
+        return np.stack([
+            radius * cos_lat * np.cos(lon_rad),
+            radius * cos_lat * np.sin(lon_rad),
+            radius * (1 - cls.ECCENTRICITY_SQUARED) * sin_lat
+        ], axis=-1)
+
+    def query(self, latitude:float, longitude:float) -> Tuple[int, float]:
+        """ Return the index of the closest route vertex and the distance to it in meters.
+
+            Inputs:
+                latitude (float): The latitude in degrees.
+                longitude (float): The longitude in degrees. """
+
+        distance, index = self.kdtree.query(self.to_ecef(latitude, longitude), k=1)
+        return int(index), float(distance)
+
+    def query_many(self, coordinates:np.ndarray, k:int=1) -> Tuple[np.ndarray, np.ndarray]:
+        """ Return the indices of the k closest route vertices and the distances to them in meters.
+
+            Inputs:
+                coordinates (np.ndarray): The coordinates with shape (n, 2) as latitude and longitude in degrees.
+                k (int): The number of closest vertices to return (default: 1). """
+
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        distances, indices = self.kdtree.query(self.to_ecef(coordinates[:, 0], coordinates[:, 1]), k=k)
+        return indices, distances
+
+    def project_many(self, coordinates:np.ndarray, k:int=4) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Project positions onto the route polyline. The segments adjacent to the k closest vertices are
+            the candidates, and the closest orthogonal projection among them is kept.
+
+            Inputs:
+                coordinates (np.ndarray): The coordinates with shape (n, 2) as latitude and longitude in degrees.
+                k (int): The number of closest vertices whose adjacent segments are considered (default: 4).
+
+            Returns:
+                segments (np.ndarray): The index of the first vertex of the projected segment.
+                fractions (np.ndarray): The position along the segment between 0 and 1.
+                distances (np.ndarray): The distance between the position and its projection in meters. """
+
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        points = self.to_ecef(coordinates[:, 0], coordinates[:, 1])
+
+        k = min(k, len(self.points))
+        _, vertices = self.kdtree.query(points, k=k)
+        vertices = vertices.reshape(len(points), k)
+
+        # Candidate segments before and after each close vertex
+        last_segment = max(len(self.points) - 2, 0)
+        candidates = np.clip(np.concatenate([vertices - 1, vertices], axis=1), 0, last_segment)
+
+        start = self.points[candidates]
+        end = self.points[np.minimum(candidates + 1, len(self.points) - 1)]
+        segment = end - start
+        to_point = points[:, np.newaxis, :] - start
+
+        squared_length = np.einsum('ijk,ijk->ij', segment, segment)
+        fractions = np.einsum('ijk,ijk->ij', to_point, segment) / np.where(squared_length > 0, squared_length, 1.0)
+        fractions = np.clip(np.where(squared_length > 0, fractions, 0.0), 0.0, 1.0)
+
+        offset = to_point - fractions[..., np.newaxis] * segment
+        squared_distances = np.einsum('ijk,ijk->ij', offset, offset)
+
+        best = np.argmin(squared_distances, axis=1)
+        rows = np.arange(len(points))
+
+        return candidates[rows, best], fractions[rows, best], np.sqrt(squared_distances[rows, best])
@@ -0,0 +1,127 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+import pandas as pd
+from typing import Tuple
+from route import Route
+from route_index import RouteIndex
+
+class RouteMatcher():
+    """ Incremental map matcher for live GPS fixes on the route. The last matched index is remembered and
+        only a forward window, sized by a plausible speed and the elapsed time, is searched, so the matched
+        cumDistance never jumps backwards. The match is anchored on the global spatial index, which may move
+        backwards, on the first fix, while the anchor is ambiguous (another stretch of the route runs as close
+        to the fix) and after MAX_LOST_FIXES consecutive fixes off the forward window.
+
+    Attributes:
+        route (Route): The route class.
+        last_index (int): The index of the last matched route vertex (None before the first fix).
+        last_time (pd.Timestamp): The time of the last matched fix.
+        lost_fixes (int): The number of consecutive fixes too far from the forward window.
+        confident (bool): Whether the match has been anchored on a single stretch of the route. """
+
+    MAX_SPEED: float = 150 / 3.6 # in m/s
+    WINDOW_MARGIN: float = 500.0 # in meters
+    DEFAULT_ELAPSED_TIME: float = 60.0 # in seconds, used when no timestamp is given
+    MAX_DISTANCE_TO_ROUTE: float = 100.0 # in meters
+    MAX_LOST_FIXES: int = 3
+    AMBIGUITY_DISTANCE: float = 30.0 # in meters, other stretches this much farther than the closest one are still plausible
+
+    def __init__(self, route:Route) -> None:
+        self.route = route
+        self.points = route.route_index.points
+        self.cum_distance = route.route_view.cum_distance
+
+        self.reset()
+
+    def reset(self, index:int=None) -> None:
+        """ Forget the matching state, or restart it from a given route index.
+
+            Inputs:
+                index (int): The route index to restart from (default: None). """
+        self.last_index = index
+        self.last_time: pd.Timestamp = pd.NaT
+        self.lost_fixes = 0
+        self.confident = index is not None
+
+    def _window_end(self, timestamp:pd.Timestamp) -> int:
+        """ Return the last index of the forward search window. """
+        if pd.isna(timestamp) or pd.isna(self.last_time):
+            elapsed_time = self.DEFAULT_ELAPSED_TIME
+        else:
+            elapsed_time = max((timestamp - self.last_time).total_seconds(), 0.0)
+
+        window_distance = self.MAX_SPEED * elapsed_time + self.WINDOW_MARGIN
+        end_index = np.searchsorted(self.cum_distance, self.cum_distance[self.last_index] + window_distance, side='right')
+
+        return min(int(end_index), len(self.cum_distance) - 1)
+
+    def _anchor(self, point:np.ndarray) -> Tuple[int, float, bool]:
+        """ Query the global index for the closest vertex, backwards or forwards of the last match. Return the index,
+            the distance and whether no other stretch of the route is as plausible, or None if no vertex is close enough. """
+        distance, index = self.route.route_index.kdtree.query(point)
+
+        if distance > self.MAX_DISTANCE_TO_ROUTE:
+            return None
+
+        # Plausible vertices farther along or back than the radius itself belong to another stretch
+        radius = distance + self.AMBIGUITY_DISTANCE
+        plausible = np.asarray(self.route.route_index.kdtree.query_ball_point(point, radius), dtype=np.int64)
+        confident = not (np.abs(self.cum_distance[plausible] - self.cum_distance[index]) > 2 * radius).any()
+
+        return int(index), float(distance), confident
+
+    def match(self, position:dict, timestamp:pd.Timestamp=pd.NaT) -> Tuple[int, float]:
+        """ Match a GPS fix to the route and return the route index and the distance to it in meters.
+
+            Inputs:
+                position (dict): The position with latitude and longitude keys.
+                timestamp (pd.Timestamp): The time of the fix, used to size the search window (default: NaT). """
+
+        self.route._check_variables({'latitude': position['latitude'], 'longitude': position['longitude']})
+        point = RouteIndex.to_ecef(position['latitude'], position['longitude'])
+
+        # First fix or ambiguous anchor: use the global index until a single stretch is plausible
+        if self.last_index is None or not self.confident:
+            anchor = self._anchor(point)
+
+            if anchor is not None:
+                index, distance, self.confident = anchor
+                self.lost_fixes = 0
+                self.last_index, self.last_time = index, timestamp
+                return index, distance
+
+            if self.last_index is None:
+                index, distance = self.route.route_index.query(position['latitude'], position['longitude'])
+                self.last_index, self.last_time = index, timestamp
+                return index, distance
+
+        # Search the forward window only
+        end_index = self._window_end(timestamp)
+        window = self.points[self.last_index:end_index + 1]
+        squared_distances = np.einsum('ij,ij->i', window - point, window - point)
+        best = int(np.argmin(squared_distances))
+
+        index = self.last_index + best
+        distance = float(np.sqrt(squared_distances[best]))
+
+        if distance <= self.MAX_DISTANCE_TO_ROUTE:
+            self.lost_fixes = 0
+            self.last_index, self.last_time = index, timestamp
+            return index, distance
+
+        # Confidence lost: hold the last index until enough consecutive fixes are off the window, then re-anchor
+        # globally, also backwards in case the previous anchor was on the wrong stretch
+        self.lost_fixes += 1
+
+        if self.lost_fixes >= self.MAX_LOST_FIXES:
+            anchor = self._anchor(point)
+
+            if anchor is not None:
+                index, distance, self.confident = anchor
+                self.lost_fixes = 0
+                self.last_index, self.last_time = index, timestamp
+                return index, distance
+
+        held_distance = float(np.linalg.norm(self.points[self.last_index] - point))
+        return self.last_index, held_distance
@@ -0,0 +1,103 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+from route_view import RouteView
+
+class RouteRanges():
+    """ Prefix sums over the route segments to answer range queries between two cumulative distances in O(log n),
+        without slicing or copying the route data. The prefix sums are linear along each segment, so they are
+        interpolated at the range bounds.
+
+    Attributes:
+        route_view (RouteView): The view of the route.
+        prefix_view (RouteView): The view with cumDistance and the prefix sums as columns. """
+
+    # Prefix sums and the route columns they are built from (the first one present is used)
+    ALTITUDE_COLUMNS: list = ['altitudeSmoothed', 'altitude']
+    INCLINATION_COLUMNS: list = ['inclinationSmoothed', 'inclination']
+    PREFIX_COLUMNS: list = ['distance', 'timeAtMaxSpeed', 'climb', 'descent', 'inclinationIntegral']
+
+    def __init__(self, route_view:RouteView) -> None:
+        self.route_view = route_view
+
+        cum_distance = np.asarray(route_view.cum_distance, dtype=np.float64)
+        segment_length = np.diff(cum_distance)
+
+        altitude = self._first_column(self.ALTITUDE_COLUMNS)
+        inclination = self._first_column(self.INCLINATION_COLUMNS)
+
+        altitude_change = np.diff(altitude)
+        mean_inclination = 0.5 * (inclination[:-1] + inclination[1:]) # trapezoidal rule
+
+        self.prefix_view = RouteView({
+            'cumDistance': cum_distance,
+            'distance': cum_distance - cum_distance[0],
+            'timeAtMaxSpeed': np.asarray(route_view.column('cumTimeAtMaxSpeedLim'), dtype=np.float64),
+            'climb': self._prefix_sum(np.maximum(altitude_change, 0.0)),
+            'descent': self._prefix_sum(np.maximum(-altitude_change, 0.0)),
+            'inclinationIntegral': self._prefix_sum(mean_inclination * segment_length) # in radians * meters
+        })
+
+    def _first_column(self, columns:list) -> np.ndarray:
+        """ Return the first of the columns present in the route as a float array. """
+        for column in columns:
+            if column in self.route_view:
+                return np.asarray(self.route_view.column(column), dtype=np.float64)
+        raise ValueError(f'The route has to have one of the columns {columns}.')
+
+    @staticmethod
+    def _prefix_sum(segment_values:np.ndarray) -> np.ndarray:
+        """ Return the prefix sum of the segment values, starting from zero at the first vertex. """
+        return np.concatenate([[0.0], np.cumsum(segment_values)])
+
+    def prefix_at(self, cum_distances:np.ndarray) -> dict:
+        """ Return the prefix sums at arbitrary cumulative distances.
+
+            Inputs:
+                cum_distances (np.ndarray): The cumulative distances in meters. """
+        return self.prefix_view.interpolate(cum_distances, columns=self.PREFIX_COLUMNS)
+
+    def query(self, start_cum_distances:np.ndarray, end_cum_distances:np.ndarray) -> dict:
+        """ Answer one or a batch of range queries between start and end cumulative distances.
+
+            Inputs:
+                start_cum_distances (np.ndarray): The start cumulative distances of the ranges in meters.
+                end_cum_distances (np.ndarray): The end cumulative distances of the ranges in meters.
+
+            Returns:
+                ranges (dict): Arrays with keys distance (in m), timeAtMaxSpeed (in s), climb and descent (in m)
+                    and meanInclination (in degrees) over each range. """
+
+        start, end = np.broadcast_arrays(np.atleast_1d(np.asarray(start_cum_distances, dtype=np.float64)),
+                                         np.atleast_1d(np.asarray(end_cum_distances, dtype=np.float64)))
+
+        if (end < start).any():
+            raise ValueError('The end of a range cannot be before its start.')
+
+        prefix = self.prefix_at(np.concatenate([start, end]))
+        n = len(start)
+
+        ranges = {column: prefix[column][n:] - prefix[column][:n] for column in self.PREFIX_COLUMNS}
+
+        # The route inclination is in radians
+        inclination_integral = np.degrees(ranges.pop('inclinationIntegral'))
+        ranges['meanInclination'] = np.divide(inclination_integral, ranges['distance'], out=np.zeros(n), where=ranges['distance'] > 0)
+
+        return ranges
+
+    def index_after_time(self, start_cum_distance:float, driving_time:float, cum_time:np.ndarray=None) -> int:
+        """ Return the index of the last route vertex reached within the driving time, starting at the first vertex
+            at or after start_cum_distance.
+
+            Inputs:
+                start_cum_distance (float): The start cumulative distance in meters.
+                driving_time (float): The driving time in seconds.
+                cum_time (np.ndarray): The cumulative driving time at each vertex in seconds (default: cumTimeAtMaxSpeedLim). """
+
+        if cum_time is None:
+            cum_time = self.prefix_view.column('timeAtMaxSpeed')
+
+        start_index = min(int(np.searchsorted(self.route_view.cum_distance, start_cum_distance, side='left')), self.route_view.length - 1)
+        end_index = int(np.searchsorted(cum_time, cum_time[start_index] + driving_time, side='right')) - 1
+
+        return max(end_index, start_index)
@@ -0,0 +1,120 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+from typing import Tuple
+from collections import OrderedDict
+from route import Route
+
+class RouteRegistry():
+    """ Registry of alternative routes (e.g. different routings or pre/post-detour variants) keyed by name.
+        Routes are loaded lazily from their compiled cache on first use, kept warm in least-recently-used
+        order and evicted when the memory cap is exceeded. Getting a warm route is O(1). Warm routes built on the
+        same coordinates share their spatial index.
+
+    Attributes:
+        memory_cap (int): The maximum memory of the warm routes in bytes.
+        sources (dict): The csv files of each registered route.
+        routes (OrderedDict): The warm routes, from the least to the most recently used. """
+
+    MEMORY_CAP: int = 512 * 1024**2 # in bytes
+
+    def __init__(self, memory_cap:int=None) -> None:
+        self.memory_cap = memory_cap if memory_cap is not None else self.MEMORY_CAP
+        self.sources: dict = {}
+        self.routes: OrderedDict = OrderedDict()
+        self.route_sizes: dict = {}
+
+    def register(self, name:str, route_file:str, control_stops_file:str=None, camping_file:str=None) -> None:
+        """ Register a route without loading it. A warm route with the same name is dropped.
+
+            Inputs:
+                name (str): The name of the route.
+                route_file (str): The csv file of the route.
+                control_stops_file (str): The csv file of the control stops (default: None).
+                camping_file (str): The csv file of the camping data (default: None). """
+        self.sources[name] = {
+            'route_file': route_file,
+            'control_stops_file': control_stops_file,
+            'camping_file': camping_file
+        }
+        self.evict(name)
+
+    def get(self, name:str) -> Route:
+        """ Return the route, loading it on first use.
+
+            Inputs:
+                name (str): The name of the route. """
+        if name in self.routes:
+            self.routes.move_to_end(name)
+            return self.routes[name]
+
+        if name not in self.sources:
+            raise ValueError(f'Route {name} is not registered. Registered routes: {list(self.sources)}')
+
+        route = Route(**self.sources[name])
+
+        # Share the spatial index of a warm route built on the same coordinates
+        for other in self.routes.values():
+            if other.route_index.key == route.route_index.key:
+                route.route_index = other.route_index
+                break
+
+        self.routes[name] = route
+        self.route_sizes[name] = self._route_size(route)
+        self._enforce_memory_cap(keep=name)
+
+        return route
+
+    def key(self, name:str) -> Tuple[str, str]:
+        """ Return the (name, content hash) key of a route, loading it if needed.
+
+            Inputs:
+                name (str): The name of the route. """
+        return name, self.get(name).content_hash
+
+    def refresh(self, name:str) -> Route:
+        """ Reload a route, e.g. after its csv files changed. The compiled cache is only rebuilt if the content changed.
+
+            Inputs:
+                name (str): The name of the route. """
+        self.evict(name)
+        return self.get(name)
+
+    def evict(self, name:str) -> None:
+        """ Drop a warm route. Its spatial index is garbage collected once no other warm route shares it.
+
+            Inputs:
+                name (str): The name of the route. """
+        self.routes.pop(name, None)
+        self.route_sizes.pop(name, None)
+
+    @property
+    def memory_usage(self) -> int:
+        """ Return the estimated memory of the warm routes in bytes. The sizes are re-estimated, since the interpolation tables are built on use. """
+        for name, route in self.routes.items():
+            self.route_sizes[name] = self._route_size(route)
+
+        # Shared spatial indices are counted once
+        indices = {route.route_index.key: route.route_index for route in self.routes.values()}
+        return sum(self.route_sizes.values()) + sum(index.points.nbytes * 2 for index in indices.values()) # points and k-d tree
+
+    @property
+    def warm_routes(self) -> list:
+        """ Return the names of the warm routes, from the least to the most recently used. """
+        return list(self.routes)
+
+    @staticmethod
+    def _route_size(route:Route) -> int:
+        """ Estimate the memory of a route without its spatial index: route columns, prefix sums and cached interpolation tables. """
+        size = sum(np.asarray(values).nbytes for values in route.route_view.columns.values())
+        size += sum(np.asarray(values).nbytes for values in route.route_ranges.prefix_view.columns.values())
+        size += sum(table.nbytes for table in route.route_view._tables.values())
+        return size
+
+    def _enforce_memory_cap(self, keep:str) -> None:
+        """ Evict the least recently used routes until the memory cap is respected. The route being loaded is kept. """
+        for name in list(self.routes):
+            if self.memory_usage <= self.memory_cap:
+                break
+            if name != keep:
+                self.evict(name)
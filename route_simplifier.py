@@ -0,0 +1,55 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+
+def douglas_peucker(points:np.ndarray, tolerance:float) -> np.ndarray:
+    """ Simplify a polyline with the Douglas-Peucker algorithm and return the indices of the kept vertices.
+        The recursion is replaced by a stack, and the distances of each range are computed in one vectorized pass.
+
+        Inputs:
+            points (np.ndarray): The vertices of the polyline with shape (n, d) in a metric space (e.g. ECEF in meters).
+            tolerance (float): The maximum distance between the polyline and its simplification in meters. """
+
+    n = len(points)
+    if n <= 2:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start = points[first]
+        chord = points[last] - start
+        to_points = points[first + 1:last] - start
+
+        # Distance of the inner vertices from the chord (from the start vertex if the chord is degenerate)
+        squared_length = chord @ chord
+        if squared_length > 0:
+            fractions = np.clip(to_points @ chord / squared_length, 0.0, 1.0)
+            offsets = to_points - fractions[:, np.newaxis] * chord
+        else:
+            offsets = to_points
+        squared_distances = np.einsum('ij,ij->i', offsets, offsets)
+
+        farthest = int(np.argmax(squared_distances))
+        if squared_distances[farthest] > tolerance**2:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep)
+
+def simplification_levels(points:np.ndarray, tolerances:list) -> dict:
+    """ Return the indices of the kept vertices for several tolerances.
+
+        Inputs:
+            points (np.ndarray): The vertices of the polyline with shape (n, d) in a metric space.
+            tolerances (list): The tolerances in meters. """
+
+    return {tolerance: douglas_peucker(points, tolerance) for tolerance in tolerances}
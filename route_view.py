@@ -0,0 +1,152 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+import pandas as pd
+
+class RouteRecord():
+    """ Lightweight row of a RouteView. Values are read lazily from the columns of the view.
+        Columns are accessed by name as with a Pandas Series (e.g. record['cumDistance']).
+
+    Attributes:
+        name (int): The index of the row in the view. """
+
+    __slots__ = ('_view', 'name')
+
+    def __init__(self, view:'RouteView', index:int) -> None:
+        self._view = view
+        self.name = index
+
+    def __getitem__(self, column:str):
+        return self._view.columns[column][self.name]
+
+    def __contains__(self, column:str) -> bool:
+        return column in self._view.columns
+
+    def __repr__(self) -> str:
+        return f"RouteRecord({self.name}, {self.to_dict()})"
+
+    def keys(self) -> list:
+        """ Return the column names. """
+        return list(self._view.columns)
+
+    def to_dict(self) -> dict:
+        """ Return the row as a dictionary. """
+        return {column: values[self.name] for column, values in self._view.columns.items()}
+
+    def to_series(self) -> pd.Series:
+        """ Return the row as a Pandas Series. """
+        return pd.Series(self.to_dict(), name=self.name)
+
+class RouteView():
+    """ Compact, array-backed view of a route table. Columns are stored as contiguous numpy arrays
+        (possibly memory-mapped) and the bounds of cumDistance are precomputed. The Pandas DataFrame
+        is only built on request.
+
+    Attributes:
+        columns (dict): The columns as contiguous numpy arrays.
+        length (int): The number of rows.
+        cum_distance (np.ndarray): The cumDistance column (None if not present).
+        cum_distance_min (float): The minimum cumDistance (NaN if not present).
+        cum_distance_max (float): The maximum cumDistance (NaN if not present). """
+
+    __slots__ = ('columns', 'length', 'cum_distance', 'cum_distance_min', 'cum_distance_max', '_dataframe', '_tables')
+
+    def __init__(self, columns:dict) -> None:
+        self.columns = {column: np.ascontiguousarray(values) for column, values in columns.items()}
+        self.length = len(next(iter(self.columns.values()))) if self.columns else 0
+
+        self.cum_distance = self.columns.get('cumDistance')
+
+        if self.cum_distance is not None and self.length > 0:
+            self.cum_distance_min = float(self.cum_distance.min())
+            self.cum_distance_max = float(self.cum_distance.max())
+        else:
+            self.cum_distance_min = np.nan
+            self.cum_distance_max = np.nan
+
+        self._dataframe = None
+        self._tables = {}
+
+    @classmethod
+    def from_dataframe(cls, df:pd.DataFrame) -> 'RouteView':
+        """ Build the view from a Pandas DataFrame.
+
+            Inputs:
+                df (pd.DataFrame): The route table. """
+        return cls({column: df[column].to_numpy() for column in df.columns})
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __contains__(self, column:str) -> bool:
+        return column in self.columns
+
+    def column(self, column:str) -> np.ndarray:
+        """ Return a column as a contiguous array.
+
+            Inputs:
+                column (str): The column name. """
+        return self.columns[column]
+
+    def record(self, index:int) -> RouteRecord:
+        """ Return a lightweight record of a row.
+
+            Inputs:
+                index (int): The index of the row. """
+        return RouteRecord(self, int(index))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ Return the view as a Pandas DataFrame, built on the first call. """
+        if self._dataframe is None:
+            self._dataframe = pd.DataFrame(self.columns)
+        return self._dataframe
+
+    def _interpolation_table(self, columns:tuple, angle_columns:tuple) -> np.ndarray:
+        """ Return the columns stacked in a (n, k) float array, cached across calls. Angles in degrees are unwrapped. """
+        key = (columns, angle_columns)
+
+        if key not in self._tables:
+            table = np.empty((self.length, len(columns)), dtype=np.float64)
+            for j, column in enumerate(columns):
+                values = np.asarray(self.columns[column], dtype=np.float64)
+                if column in angle_columns:
+                    values = np.degrees(np.unwrap(np.radians(values)))
+                table[:, j] = values
+            self._tables[key] = table
+
+        return self._tables[key]
+
+    def interpolate(self, cum_distances:np.ndarray, columns:list, step_columns:list=(), angle_columns:list=()) -> dict:
+        """ Interpolate columns at arbitrary cumulative distances in one vectorized pass.
+            Values outside the route are clipped to the first and last rows, as with np.interp.
+
+            Inputs:
+                cum_distances (np.ndarray): The cumulative distances in meters.
+                columns (list): The columns to be linearly interpolated.
+                step_columns (list): The columns to be held from the previous row (e.g. maxSpeed).
+                angle_columns (list): The columns in columns interpolated along the shortest arc, in degrees [0, 360). """
+
+        x = np.atleast_1d(np.asarray(cum_distances, dtype=np.float64))
+        xp = self.cum_distance
+
+        previous_rows = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, self.length - 1)
+
+        interpolated = {}
+
+        if columns:
+            table = self._interpolation_table(tuple(columns), tuple(angle_columns))
+
+            rows = np.minimum(previous_rows, max(self.length - 2, 0))
+            next_rows = np.minimum(rows + 1, self.length - 1)
+            span = xp[next_rows] - xp[rows]
+            fractions = np.clip(np.divide(x - xp[rows], span, out=np.zeros_like(x), where=span > 0), 0.0, 1.0)
+
+            values = table[rows] + fractions[:, np.newaxis] * (table[next_rows] - table[rows])
+
+            for j, column in enumerate(columns):
+                interpolated[column] = np.mod(values[:, j], 360.0) if column in angle_columns else values[:, j]
+
+        for column in step_columns:
+            interpolated[column] = self.columns[column][previous_rows]
+
+        return interpolated
@@ -0,0 +1,256 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+import pandas as pd
+from route_view import RouteView
+
+IMPORTANCE_WEIGHTS: dict = {
+    'uniform': 1.0, # floor, bounds the largest gap between two sites
+    'theta': 1.0, # heading changes (curves)
+    'altitude': 1.0, # altitude changes (hills)
+    'time': 1.0, # driving time per meter (slow sections)
+    'forecast': 1.0 # spatial gradients of the previous forecast
+}
+MAX_RELATIVE_IMPORTANCE: float = 5.0 # cap of each normalized criterion, so that one feature cannot take the whole budget
+SMOOTHING_DISTANCE: float = 5000.0 # in meters, width of the moving window of the importance density
+FORECAST_GRADIENT_COLUMNS: list = ['gh', 'tt', 'ff']
+
+DRIVING_HOURS: tuple = (8, 17) # local hours of the daily driving window
+OVERNIGHT_WINDOW: float = 3600.0 # in seconds of driving before and after each overnight stop with denser sites
+OVERNIGHT_DENSITY: int = 2 # sites per time spacing around the overnight stops
+
+def _normalized(rates:np.ndarray, lengths:np.ndarray) -> np.ndarray:
+    """ Scale rates per meter so that their length-weighted mean is 1, capped at MAX_RELATIVE_IMPORTANCE.
+        Return zeros if the rates are all zero. """
+    total_length = lengths.sum()
+    mean = (rates * lengths).sum() / total_length if total_length > 0 else 0.0
+    return np.minimum(rates / mean, MAX_RELATIVE_IMPORTANCE) if mean > 0 else np.zeros_like(rates)
+
+def _smoothed(rates:np.ndarray, cum_distances:np.ndarray, smoothing_distance:float) -> np.ndarray:
+    """ Average rates per meter of each segment over a moving window centered on the segment. """
+    if smoothing_distance <= 0:
+        return rates
+
+    integral = np.concatenate(([0.0], np.cumsum(rates * np.diff(cum_distances))))
+    middles = (cum_distances[:-1] + cum_distances[1:]) / 2
+    lower = np.maximum(middles - smoothing_distance / 2, cum_distances[0])
+    upper = np.minimum(middles + smoothing_distance / 2, cum_distances[-1])
+    width = upper - lower
+
+    return np.divide(np.interp(upper, cum_distances, integral) - np.interp(lower, cum_distances, integral), width,
+                     out=rates.astype(np.float64), where=width > 0)
+
+def importance_density(view:RouteView, start_index:int, end_index:int, forecast_gradients:pd.DataFrame=None,
+                       weights:dict=None, smoothing_distance:float=SMOOTHING_DISTANCE) -> np.ndarray:
+    """ Return the importance per meter of each route segment between the start and end index (included).
+        Each criterion is normalized to a mean of 1 and weighted; the uniform floor keeps sites on straight, flat segments.
+
+        Inputs:
+            view (RouteView): The route view with cumDistance and optionally theta, altitudeSmoothed (or altitude) and cumTimeAtMaxSpeedLim columns.
+            start_index (int): The index of the first row.
+            end_index (int): The index of the last row.
+            forecast_gradients (pd.DataFrame): Spatial gradients of a previous forecast with cumDistance and gradient columns (default: None).
+            weights (dict): The weights of the criteria, missing keys use IMPORTANCE_WEIGHTS (default: None).
+            smoothing_distance (float): The width of the moving window in meters (default: SMOOTHING_DISTANCE). """
+
+    weights = {**IMPORTANCE_WEIGHTS, **(weights or {})}
+    rows = slice(start_index, end_index + 1)
+
+    cum_distances = np.asarray(view.cum_distance[rows], dtype=np.float64)
+    lengths = np.diff(cum_distances)
+
+    def rate(changes:np.ndarray) -> np.ndarray:
+        return np.divide(np.abs(changes), lengths, out=np.zeros_like(lengths), where=lengths > 0)
+
+    changes = {}
+    if 'theta' in view:
+        changes['theta'] = (np.diff(np.asarray(view.column('theta')[rows], dtype=np.float64)) + 180.0) % 360.0 - 180.0
+    altitude_column = 'altitudeSmoothed' if 'altitudeSmoothed' in view else 'altitude'
+    if altitude_column in view:
+        changes['altitude'] = np.diff(np.asarray(view.column(altitude_column)[rows], dtype=np.float64))
+    if 'cumTimeAtMaxSpeedLim' in view:
+        changes['time'] = np.diff(np.asarray(view.column('cumTimeAtMaxSpeedLim')[rows], dtype=np.float64))
+
+    density = np.full(len(lengths), weights['uniform'], dtype=np.float64)
+
+    for criterion, criterion_changes in changes.items():
+        if weights[criterion] > 0:
+            density += weights[criterion] * _normalized(_smoothed(rate(criterion_changes), cum_distances, smoothing_distance), lengths)
+
+    if forecast_gradients is not None and len(forecast_gradients) > 0 and weights['forecast'] > 0:
+        middles = (cum_distances[:-1] + cum_distances[1:]) / 2
+        gradients = np.interp(middles, forecast_gradients['cumDistance'].to_numpy(dtype=np.float64), forecast_gradients['gradient'].to_numpy(dtype=np.float64))
+        density += weights['forecast'] * _normalized(gradients, lengths)
+
+    return density
+
+def place_sites(cum_distances:np.ndarray, density:np.ndarray, number_sites:int) -> np.ndarray:
+    """ Return the cumulative distances of the sites so that each gap holds the same amount of importance.
+        The first and last sites are on the first and last cumulative distances.
+
+        Inputs:
+            cum_distances (np.ndarray): The cumulative distances of the route rows in meters.
+            density (np.ndarray): The importance per meter of each segment between the rows.
+            number_sites (int): The number of sites. """
+
+    cum_distances = np.asarray(cum_distances, dtype=np.float64)
+    cumulative_importance = np.concatenate(([0.0], np.cumsum(density * np.diff(cum_distances))))
+
+    targets = np.linspace(0.0, cumulative_importance[-1], number_sites)
+
+    return np.interp(targets, cumulative_importance, cum_distances)
+
+def forecast_gradients(forecast_df:pd.DataFrame, columns:list=None) -> pd.DataFrame:
+    """ Return the spatial gradients between consecutive sites of a forecast, averaged over time.
+        The gradients of each column are normalized to a mean of 1 before being summed.
+
+        Inputs:
+            forecast_df (pd.DataFrame): The forecast with (cumDistance, time) multi-index, e.g. from SolcastExecuter.get_forecasts.
+            columns (list): The forecast columns to be considered (default: FORECAST_GRADIENT_COLUMNS present in the forecast). """
+
+    if columns is None:
+        columns = [column for column in FORECAST_GRADIENT_COLUMNS if column in forecast_df.columns]
+
+    cum_distances = np.sort(forecast_df.index.get_level_values('cumDistance').unique().to_numpy(dtype=np.float64))
+
+    if len(cum_distances) < 2 or not columns:
+        return pd.DataFrame({'cumDistance': [], 'gradient': []})
+
+    gaps = np.diff(cum_distances)
+    gradient = np.zeros(len(gaps), dtype=np.float64)
+
+    for column in columns:
+        # Sites as rows and times as columns
+        values = forecast_df[column].unstack('time').reindex(cum_distances).to_numpy(dtype=np.float64)
+        column_gradient = np.nanmean(np.abs(np.diff(values, axis=0)), axis=1) / np.where(gaps > 0, gaps, np.inf)
+        gradient += _normalized(np.nan_to_num(column_gradient), gaps)
+
+    return pd.DataFrame({'cumDistance': (cum_distances[:-1] + cum_distances[1:]) / 2, 'gradient': gradient})
+
+def driving_times(view:RouteView, start_index:int, end_index:int, speed=None) -> np.ndarray:
+    """ Return the driving time in seconds from the start row to each row between the start and end index (included).
+
+        Inputs:
+            view (RouteView): The route view with cumDistance and cumTimeAtMaxSpeedLim columns.
+            start_index (int): The index of the first row.
+            end_index (int): The index of the last row.
+            speed (float or np.ndarray): The speed in km/h, constant or for each route row (default: None, cumTimeAtMaxSpeedLim is used). """
+
+    rows = slice(start_index, end_index + 1)
+
+    if speed is None:
+        if 'cumTimeAtMaxSpeedLim' not in view:
+            raise ValueError('The route has no cumTimeAtMaxSpeedLim column. Give a speed instead.')
+        cum_time = np.asarray(view.column('cumTimeAtMaxSpeedLim')[rows], dtype=np.float64)
+        return cum_time - cum_time[0]
+
+    speed = np.asarray(speed, dtype=np.float64)
+    if speed.ndim > 0:
+        if len(speed) != len(view):
+            raise ValueError(f'The speed profile has to have one value per route row. Received: {len(speed)} values for {len(view)} rows')
+        speed = speed[start_index + 1:end_index + 1]
+    if np.any(speed <= 0):
+        raise ValueError('The speed has to be positive')
+
+    lengths = np.diff(np.asarray(view.cum_distance[rows], dtype=np.float64))
+    return np.concatenate(([0.0], np.cumsum(lengths / speed * 3.6)))
+
+class DrivingDay():
+    """ Daily driving window of the race: the car drives between the start and end hours and stops overnight.
+        Converts driving time from the start time to arrival times and back.
+
+    Attributes:
+        begin (pd.Timestamp): The time at which the car starts driving (start time moved into the driving window).
+        day_start (pd.Timestamp): The start of the driving window of the first day.
+        first_day (float): The driving time left in the first day in seconds.
+        daily (float): The driving time of a full day in seconds. """
+
+    def __init__(self, start_time:pd.Timestamp, driving_hours:tuple=DRIVING_HOURS) -> None:
+        start_hour, end_hour = driving_hours
+        if not (0 <= start_hour < end_hour <= 24):
+            raise ValueError(f'The driving hours have to be increasing and within a day. Received: {driving_hours}')
+
+        self.daily = (end_hour - start_hour) * 3600.0
+
+        self.day_start = start_time.normalize() + pd.Timedelta(hours=start_hour)
+        day_end = start_time.normalize() + pd.Timedelta(hours=end_hour)
+
+        # Move the start into the driving window
+        if start_time >= day_end:
+            self.day_start += pd.Timedelta(days=1)
+            day_end += pd.Timedelta(days=1)
+        self.begin = max(start_time, self.day_start)
+
+        self.first_day = (day_end - self.begin).total_seconds()
+
+    def arrival_times(self, driving_times:np.ndarray) -> pd.DatetimeIndex:
+        """ Return the arrival times after the driving times.
+
+            Inputs:
+                driving_times (np.ndarray): The driving times from the start time in seconds. """
+        driving_times = np.asarray(driving_times, dtype=np.float64)
+
+        later_days = np.ceil(np.maximum(driving_times - self.first_day, 0.0) / self.daily)
+        offsets = np.where(
+            later_days == 0,
+            (self.begin - self.day_start).total_seconds() + driving_times,
+            driving_times - self.first_day - (later_days - 1) * self.daily
+        )
+
+        return self.day_start + pd.to_timedelta(later_days, unit='D') + pd.to_timedelta(offsets, unit='s')
+
+    def driving_time_until(self, end_time:pd.Timestamp) -> float:
+        """ Return the driving time in seconds between the start time and the end time.
+
+            Inputs:
+                end_time (pd.Timestamp): The end time. """
+        if end_time <= self.begin:
+            return 0.0
+
+        days = (end_time.normalize() - self.day_start.normalize()).days
+        if days == 0:
+            return min((end_time - self.begin).total_seconds(), self.first_day)
+
+        last_day = (end_time - (self.day_start + pd.Timedelta(days=days))).total_seconds()
+        return self.first_day + (days - 1) * self.daily + min(max(last_day, 0.0), self.daily)
+
+    def overnight_stops(self, driving_time:float) -> np.ndarray:
+        """ Return the driving times of the overnight stops within the driving time.
+
+            Inputs:
+                driving_time (float): The total driving time in seconds. """
+        return np.arange(self.first_day, driving_time, self.daily)
+
+def arrival_sites(driving_times:np.ndarray, driving_day:DrivingDay, time_spacing:float, horizon_end:pd.Timestamp=None,
+                  overnight_window:float=OVERNIGHT_WINDOW, overnight_density:int=OVERNIGHT_DENSITY) -> np.ndarray:
+    """ Return the driving times of the sites: one site every time_spacing of driving, denser sites around each overnight stop
+        with one site on the stop itself, and no site after the forecast horizon.
+
+        Inputs:
+            driving_times (np.ndarray): The driving times of the route rows from the start in seconds.
+            driving_day (DrivingDay): The daily driving window.
+            time_spacing (float): The driving time between two sites in seconds.
+            horizon_end (pd.Timestamp): The end of the forecast horizon (default: None, no horizon).
+            overnight_window (float): The driving time before and after each overnight stop with denser sites in seconds.
+            overnight_density (int): The number of sites per time_spacing around the overnight stops. """
+
+    last_time = float(driving_times[-1])
+    if horizon_end is not None:
+        last_time = min(last_time, driving_day.driving_time_until(horizon_end))
+
+    sites = np.arange(0.0, last_time, time_spacing)
+
+    stops = driving_day.overnight_stops(last_time)
+    if len(stops) > 0:
+        # Replace the regular sites around the stops by denser ones aligned on the stops
+        distance_to_stop = np.abs(sites[:, np.newaxis] - stops[np.newaxis, :]).min(axis=1)
+        sites = sites[distance_to_stop >= overnight_window]
+
+        steps = np.arange(-np.ceil(overnight_window * overnight_density / time_spacing), np.ceil(overnight_window * overnight_density / time_spacing) + 1)
+        offsets = steps * time_spacing / overnight_density
+        offsets = offsets[np.abs(offsets) < overnight_window]
+        sites = np.concatenate((sites, (stops[:, np.newaxis] + offsets[np.newaxis, :]).ravel()))
+
+    sites = np.unique(np.clip(np.append(sites, last_time), 0.0, last_time))
+
+    return sites
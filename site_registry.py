@@ -0,0 +1,184 @@
+# Created by aCentauri Solar Racing October 2026
+
+import os
+import time
+import pickle
+import threading
+import constants
+import numpy as np
+import pandas as pd
+
+class SiteRegistry():
+    """ Local authoritative copy of the Meteotest sites. It is updated from the siteadd, siteedit and sitedelete responses,
+        persisted to disk after each change, and reconciled with siteinfo only when reconcile_interval has elapsed or a drift
+        was detected. Each change increments the version. The sites dataframe is replaced rather than modified, so readers
+        never see a partial change.
+
+    Attributes:
+        path (str): The file of the registry.
+        source (str): The API the sites belong to, e.g. the website of the requester. A registry saved for another source is not loaded.
+        reconcile_interval (float): The time between reconciliations with siteinfo in seconds.
+        sites (pd.DataFrame): The sites with site_id as index and name, longitude, latitude, altitude, and UTC_offset as columns.
+        version (int): The number of changes since the registry was created.
+        reconciled_time (float): The Unix time of the last reconciliation, NaN if never reconciled.
+        drift_detected (bool): Whether the registry may differ from the provider and has to be reconciled. """
+
+    RECONCILE_INTERVAL: float = getattr(constants, 'METEOTEST_RECONCILE_INTERVAL', 6 * 3600) # in seconds
+    COLUMNS: list = ['name', 'longitude', 'latitude', 'altitude', 'UTC_offset']
+    POSITION_DECIMALS: int = 5 # about 1 m, positions closer than this are the same
+
+    def __init__(self, path:str=None, source:str=None, reconcile_interval:float=None) -> None:
+        if path is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
+            path = getattr(constants, 'METEOTEST_SITE_REGISTRY', os.path.join(script_directory, '.meteotest_sites.pkl'))
+
+        self.path = path
+        self.source = source
+        self.reconcile_interval = reconcile_interval if reconcile_interval is not None else self.RECONCILE_INTERVAL
+
+        if self.reconcile_interval <= 0:
+            raise ValueError(f'reconcile_interval has to be positive. Received: {self.reconcile_interval}')
+
+        self.sites = self._empty_sites()
+        self.version: int = 0
+        self.reconciled_time: float = float('nan')
+        self.drift_detected: bool = False
+
+        self.lock = threading.RLock()
+        self._ids: frozenset = frozenset()
+
+        self.load()
+
+    @classmethod
+    def _empty_sites(cls) -> pd.DataFrame:
+        return pd.DataFrame(columns=cls.COLUMNS, index=pd.Index([], dtype=np.int64, name='site_id'))
+
+    @property
+    def ids(self) -> frozenset:
+        """ Return the site ids. """
+        return self._ids
+
+    def __contains__(self, site_id:int) -> bool:
+        return site_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def needs_reconciliation(self) -> bool:
+        """ Return whether the registry has to be reconciled with siteinfo. """
+        return self.drift_detected or not time.time() - self.reconciled_time < self.reconcile_interval
+
+    def load(self) -> bool:
+        """ Load the registry from disk. Return whether it was loaded. """
+        try:
+            with open(self.path, 'rb') as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            return False
+
+        if entry['source'] != self.source:
+            return False
+
+        with self.lock:
+            self.sites = entry['sites']
+            self.version = entry['version']
+            self.reconciled_time = entry['reconciled_time']
+            self._ids = frozenset(self.sites.index.tolist())
+
+        return True
+
+    def save(self) -> None:
+        """ Write the registry to disk, through a temporary file so that a crash never leaves a partial registry. """
+        with self.lock:
+            entry = {'source': self.source, 'version': self.version, 'reconciled_time': self.reconciled_time, 'sites': self.sites}
+
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.path)
+
+    def _commit(self, sites:pd.DataFrame) -> None:
+        """ Replace the sites, increment the version and save. Called with the lock held. """
+        self.sites = sites
+        self._ids = frozenset(sites.index.tolist())
+        self.version += 1
+        self.save()
+
+    def add(self, site_df:pd.DataFrame) -> None:
+        """ Add the sites of a siteadd response.
+
+            Inputs:
+                site_df (pd.DataFrame): The new sites with site_id as index. """
+        with self.lock:
+            sites = pd.concat([self.sites, site_df[self.COLUMNS]]) if not self.sites.empty else site_df[self.COLUMNS].copy()
+            self._commit(sites)
+
+    def edit(self, site_id:int, **values) -> None:
+        """ Change the columns of a site after a siteedit.
+
+            Inputs:
+                site_id (int): The id of the site.
+                **values: The new values by column, e.g. name, latitude, and longitude. """
+        with self.lock:
+            if site_id not in self._ids:
+                self.mark_drift(f'site {site_id} edited but not in the registry')
+                return
+
+            sites = self.sites.copy()
+            for column, value in values.items():
+                sites.at[site_id, column] = value
+            self._commit(sites)
+
+    def delete(self, site_id:int) -> None:
+        """ Remove a site after a sitedelete.
+
+            Inputs:
+                site_id (int): The id of the site. """
+        with self.lock:
+            if site_id not in self._ids:
+                self.mark_drift(f'site {site_id} deleted but not in the registry')
+                return
+
+            self._commit(self.sites.drop(site_id))
+
+    def mark_drift(self, reason:str) -> None:
+        """ Flag the registry for reconciliation.
+
+            Inputs:
+                reason (str): The observation that the provider differs from the registry. """
+        if not self.drift_detected:
+            print(f'Meteotest site registry drift: {reason}.')
+        self.drift_detected = True
+
+    def _differs(self, site_info_df:pd.DataFrame) -> bool:
+        """ Return whether the sites differ from siteinfo in ids, names, or positions. """
+        if set(site_info_df.index.tolist()) != self._ids:
+            return True
+
+        sites = self.sites.loc[site_info_df.index]
+        positions = sites[['latitude', 'longitude']].to_numpy(dtype=np.float64).round(self.POSITION_DECIMALS)
+        info_positions = site_info_df[['latitude', 'longitude']].to_numpy(dtype=np.float64).round(self.POSITION_DECIMALS)
+
+        return not (np.array_equal(positions, info_positions) and sites['name'].astype(str).tolist() == site_info_df['name'].astype(str).tolist())
+
+    def reconcile(self, site_info_df:pd.DataFrame) -> bool:
+        """ Make the registry match siteinfo. Return whether they differed.
+
+            Inputs:
+                site_info_df (pd.DataFrame): The sites from siteinfo, empty if there are none. """
+        if site_info_df.empty:
+            site_info_df = self._empty_sites()
+
+        with self.lock:
+            differed = self._differs(site_info_df)
+
+            self.reconciled_time = time.time()
+            self.drift_detected = False
+
+            if differed:
+                self._commit(site_info_df[self.COLUMNS].copy())
+            else:
+                self.save()
+
+        return differed
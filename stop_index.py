@@ -0,0 +1,83 @@
+# Created by aCentauri Solar Racing October 2026
+
+import numpy as np
+import pandas as pd
+from route_view import RouteView, RouteRecord
+
+class StopIndex():
+    """ Index of stops along the route (control stops or campsites) sorted by cumDistance.
+        Queries accept arrays of cumulative distances and return row positions in the stops dataframe,
+        with NO_STOP where there is no stop (e.g. after the last one).
+
+    Attributes:
+        stops_view (RouteView): The view of the stops in the original order.
+        cum_distance (np.ndarray): The sorted cumDistance of the stops.
+        positions (np.ndarray): The row positions of the sorted stops in the stops dataframe. """
+
+    NO_STOP: int = -1
+
+    def __init__(self, stops_df:pd.DataFrame) -> None:
+        if 'cumDistance' not in stops_df.columns:
+            raise ValueError('The stops dataframe has to have the cumDistance column. Annotate it first with Route.annotate_stops.')
+
+        self.stops_view = RouteView.from_dataframe(stops_df)
+
+        cum_distance = stops_df['cumDistance'].to_numpy(dtype=np.float64)
+        self.positions = np.argsort(cum_distance, kind='stable')
+        self.cum_distance = cum_distance[self.positions]
+
+    def __len__(self) -> int:
+        return len(self.cum_distance)
+
+    def _to_positions(self, sorted_indices:np.ndarray) -> np.ndarray:
+        """ Convert indices in the sorted order to row positions, NO_STOP if out of bounds. """
+        valid = (sorted_indices >= 0) & (sorted_indices < len(self.positions))
+        return np.where(valid, self.positions[np.clip(sorted_indices, 0, max(len(self.positions) - 1, 0))], self.NO_STOP)
+
+    def next(self, cum_distances:np.ndarray, offset:int=0, inclusive:bool=False) -> np.ndarray:
+        """ Return the row positions of the next stops after the cumulative distances.
+
+            Inputs:
+                cum_distances (np.ndarray): The cumulative distances in meters.
+                offset (int): The number of next stops to skip (default: 0).
+                inclusive (bool): Whether a stop at the same cumulative distance counts as next (default: False). """
+        side = 'left' if inclusive else 'right'
+        sorted_indices = np.searchsorted(self.cum_distance, np.atleast_1d(cum_distances), side=side) + offset
+        return self._to_positions(sorted_indices)
+
+    def previous(self, cum_distances:np.ndarray, inclusive:bool=True) -> np.ndarray:
+        """ Return the row positions of the previous stops before the cumulative distances.
+
+            Inputs:
+                cum_distances (np.ndarray): The cumulative distances in meters.
+                inclusive (bool): Whether a stop at the same cumulative distance counts as previous (default: True). """
+        side = 'right' if inclusive else 'left'
+        sorted_indices = np.searchsorted(self.cum_distance, np.atleast_1d(cum_distances), side=side) - 1
+        return self._to_positions(sorted_indices)
+
+    def count_within(self, start_cum_distances:np.ndarray, end_cum_distances:np.ndarray) -> np.ndarray:
+        """ Return the number of stops with start <= cumDistance <= end for each range.
+
+            Inputs:
+                start_cum_distances (np.ndarray): The start cumulative distances in meters.
+                end_cum_distances (np.ndarray): The end cumulative distances in meters. """
+        first = np.searchsorted(self.cum_distance, np.atleast_1d(start_cum_distances), side='left')
+        last = np.searchsorted(self.cum_distance, np.atleast_1d(end_cum_distances), side='right')
+        return np.maximum(last - first, 0)
+
+    def within(self, start_cum_distance:float, end_cum_distance:float) -> np.ndarray:
+        """ Return the row positions of the stops with start <= cumDistance <= end, sorted by cumDistance.
+
+            Inputs:
+                start_cum_distance (float): The start cumulative distance in meters.
+                end_cum_distance (float): The end cumulative distance in meters. """
+        first = np.searchsorted(self.cum_distance, start_cum_distance, side='left')
+        last = np.searchsorted(self.cum_distance, end_cum_distance, side='right')
+        return self.positions[first:max(last, first)]
+
+    def record(self, position:int) -> RouteRecord:
+        """ Return a lightweight record of the stop at the row position.
+
+            Inputs:
+                position (int): The row position in the stops dataframe. """
+        return self.stops_view.record(position)
@@ -1,6 +1,7 @@
 # Created by Giacomo Mastroddi October 2023
 
 import functions
+import numpy as np
 import pandas as pd
 from route import Route
 from gps import GPS
@@ -17,24 +18,31 @@ class TimeSpaceForecaster():
         self.db_querier = db_querier
         self.opt_reader = optimal_reader
 
-        self.route_data = self.route.get_route_data
         self.control_stops = self.route.get_control_stops_data
 
         self.current_cumDistance: float = 0.0
 
-        self.working_df = pd.DataFrame()
-        self.working_col_name = ''
+        # Cumulative driving time at each route vertex for the chosen speed
+        self.working_time = np.array([])
+
+    def set_route(self, route:Route) -> None:
+        """ Switch to another route, e.g. a detour from the route registry. The working time is recomputed on the next forecast.
+
+            Inputs:
+                route (Route): The new route. """
+        self.route = route
+        self.control_stops = self.route.get_control_stops_data
+
+        self.working_time = np.array([])
     
     def _cum_time_at_input_velocity(self, velocity:float) -> None:
         """ Update the working dataframe with the cumulative time at the input velocity.
         
             Inputs:
                 velocity (float): The velocity in km/h."""
-        time_at_input_v = self.route_data['distance'] / velocity * 3.6
+        time_at_input_v = self.route.route_view.column('distance') / velocity * 3.6
 
-        self.working_col_name = 'cumTimeAtInputVelocity'
-        self.working_df = self.route_data.copy()
-        self.working_df[self.working_col_name] = time_at_input_v.cumsum()
+        self.working_time = np.cumsum(time_at_input_v)
     
     def _recursive_position_finder(self, driving_time:float, cs_to_skip:int, print_is_requested:bool=False) -> pd.Series:
         """ Recursively find the position at the end of the driving time considering the control stops.
@@ -43,43 +51,37 @@ class TimeSpaceForecaster():
                 driving_time (float): The driving time in seconds.
                 cs_to_skip (int): The number of control stops to skip.
                 print_is_requested (bool): If the print is requested (default: False)."""
-        # Cut data at current position (lower cut)
-        cut_data = self.working_df.copy()
+        route_view = self.route.route_view
 
-        cut_data = cut_data[cut_data['cumDistance'] >= self.current_cumDistance]
-        cut_data = cut_data.reset_index(drop=True)
-
-        current_time = cut_data[self.working_col_name][0]
+        # Stop cases
+        # Reach end of route, return last point
+        if self.current_cumDistance >= route_view.cum_distance_max:
+            return route_view.record(route_view.length - 1) # return self.end_position
 
-        # Cut data at driving time (upper cut)
-        cut_data = cut_data[cut_data[self.working_col_name] <= current_time + driving_time]
-        max_cumDistance = cut_data['cumDistance'].max()
+        # Last vertex reached within the driving time, found on the cumulative time without copying the route
+        end_index = self.route.route_ranges.index_after_time(self.current_cumDistance, driving_time, cum_time=self.working_time)
+        max_cumDistance = route_view.cum_distance[end_index]
 
         # Check if the control stop dataframe is not empty
-        if not self.control_stops.empty:
-            cs_in_range_mask = (self.control_stops['cumDistance'] >= self.current_cumDistance) & (self.control_stops['cumDistance'] <= max_cumDistance)
-            cs_in_range = cs_in_range_mask.sum()
+        cs_in_range = 0
+        if self.route.control_stops_index is not None and len(self.route.control_stops_index) > 0:
+            cs_in_range = int(self.route.control_stops_index.count_within(self.current_cumDistance, max_cumDistance)[0])
 
             if print_is_requested:
                 print(f'cs found ahead: {cs_in_range}')
                 print(f'cs to skip: {cs_to_skip}')
         else:
             print("No control stop dataframe given")
-
-        # Stop cases
-        # Reach end of route, return last point
-        if self.current_cumDistance >= self.route_data.iloc[-1]['cumDistance']:
-            return self.route_data.iloc[-1] # return self.end_position
         
         # All control stops considered
         if cs_to_skip == cs_in_range:
             print("All control stops considered")
-            return self.route_data.loc[self.route_data['cumDistance'] == max_cumDistance].iloc[0]
+            return route_view.record(np.searchsorted(route_view.cum_distance, max_cumDistance, side='left'))
         
         # Stop at control stop for the night, meaning we arrive at cs between 16:30 and 17:00
         if cs_to_skip > cs_in_range:
             print("Stop at control stop for the night")
-            return self.control_stops.loc[self.control_stops['cumDistance'] > self.current_cumDistance].iloc[cs_to_skip - 1]
+            return self.route.control_stops_index.record(self.route.control_stops_index.next(self.current_cumDistance, offset=cs_to_skip - 1)[0])
         
 
         # Recursive call to skip control stop and reduce driving time by 30 minutes (passed in seconds)
@@ -107,29 +109,28 @@ class TimeSpaceForecaster():
             raise ValueError(f"Driving time is negative: {driving_time.total_seconds()}")
 
         if "max_speed" in type:
-            # Set working dataframe
-            self.working_df = self.route_data.copy()
-            self.working_col_name = 'cumTimeAtMaxSpeedLim'
+            # Set working cumulative time
+            self.working_time = self.route.route_view.column('cumTimeAtMaxSpeedLim')
 
         elif "mean_speed_cruise" in type:
             # Call the db querier
             mean_velocity = self.db_querier.get_day_mean_velocity60
 
-            # Set working dataframe
+            # Set working cumulative time
             self._cum_time_at_input_velocity(mean_velocity)
 
         elif "mean_speed" in type:
             # Call the db querier
             mean_velocity = self.db_querier.get_day_mean_velocity
 
-            # Set working dataframe
+            # Set working cumulative time
             self._cum_time_at_input_velocity(mean_velocity)
 
         elif "optimal_speed" in type:
             # Call the opt reader
             opt_velocity = self.opt_reader.get_mean_velocity #TODO IMPROVE OPTIMIZED VELOCITY
 
-            # Set working dataframe
+            # Set working cumulative time
             self._cum_time_at_input_velocity(opt_velocity)
 
         else: